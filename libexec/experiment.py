@@ -32,6 +32,8 @@ sensibility = Command('sensibility', '-l', 'java')
 train = sensibility('train-lstm')
 # The evaluation command.
 evaluate = sensibility('evaluate')
+# Fails if the model was not created.
+check_exists = Command('test', '-d')
 
 
 class Experiment:
@@ -55,11 +57,12 @@ class Experiment:
             forwards_model = self.model_dir / config.hashed_slug.with_suffix('.forwards')
             backwards_model = self.model_dir / config.hashed_slug.with_suffix('.backwards')
 
+            # Both models are trained at once, from the same batches.
             make.rule(forwards_model).set_recipe(
-                train(forwards=True, output_dir='$@', **config),
+                train(both=True, output_dir='$(basename $@)', **config),
             )
-            make.rule(backwards_model).set_recipe(
-                train(backwards=True, output_dir='$@', **config)
+            make.rule(backwards_model).depends_on(forwards_model).set_recipe(
+                check_exists('$@')
             )
             models.append((forwards_model, backwards_model))
 
@@ -18,8 +18,6 @@
 Sensibility --- detect and fix syntax errors in source code.
 """
 
-import pkg_resources
-
 from .edit import Edit, Insertion, Deletion, Substitution
 from .language import Language, current_language
 from .lexical_analysis import Lexeme, Token, Location, Position
@@ -27,7 +25,9 @@ from .source_vector import SourceVector
 from .vocabulary import Vocabulary, Vind
 
 # Get the current version from setup.py
-__version__ = pkg_resources.get_distribution(__name__).version
+# Kept in sync with setup.py, which reads it from here. Looking up the
+# installed distribution (with pkg_resources) slows down every import.
+__version__ = '0.3.dev0'
 
 # XXX: Deprecated: this alias
 language = current_language
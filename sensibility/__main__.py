@@ -22,13 +22,31 @@ Allows one to set the language prior to running any of the scripts:
 Usage:
 
     sensibility [-l LANGUAGE] <command> [<args>]
+    sensibility [-l LANGUAGE] batch < commands
+
+Python scripts are run in this process, rather than starting a new
+interpreter. `batch` runs one command per line of its input in the same
+process, so modules are only imported once. Each line may redirect the
+command's standard input and output, like the shell:
+
+    -l java sources path --prefix=java/ < partitions/0/training > java-0.txt
+
+In batch mode, commands must use sys.stdin (or sys.stdin.buffer) and
+sys.stdout (not file descriptors 0 and 1), which are empty and the batch's
+output by default.
 """
 
+import io
 import os
+import runpy
+import shlex
+import subprocess
 import sys
+import traceback
+from contextlib import ExitStack
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
 
 from sensibility._paths import REPOSITORY_ROOT
 
@@ -47,7 +65,9 @@ def main() -> None:
     if args.language is not None:
         env.update(SENSIBILITY_LANGUAGE=args.language)
 
-    if args.subcommand:
+    if args.subcommand == ['batch']:
+        sys.exit(run_batch(sys.stdin, env))
+    elif args.subcommand:
         run_subcommand(args.subcommand, env)
     else:
         list_commands()
@@ -58,9 +78,161 @@ def run_subcommand(command, env) -> None:
     bin, args = get_bin_and_argv(command)
     if not bin.exists():
         usage_error("Unknown executable:", bin)
+    if is_python_script(bin):
+        os.environ.update(env)
+        sys.exit(run_in_process(bin, args))
     os.execve(str(bin.absolute()), args, env)
 
 
+def run_in_process(bin: Path, argv: List[str]) -> int:
+    """
+    Runs a Python script as __main__ in this process, with the given
+    argument vector. Returns its exit status.
+    """
+    saved_argv, saved_path = sys.argv, sys.path[:]
+    sys.argv = argv
+    sys.path.insert(0, str(bin.parent))
+    try:
+        runpy.run_path(str(bin), run_name='__main__')
+    except SystemExit as exit:
+        return exit_status(exit)
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+    return 0
+
+
+def run_batch(commands: Iterable[str], env: Dict[str, str]) -> int:
+    """
+    Runs every command (one per line) in this process. Returns 0 if every
+    command succeeded, and 1 otherwise.
+    """
+    failed = False
+    saved_environ = dict(os.environ)
+    try:
+        for line in commands:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            # Every command starts with the batch's language and environment.
+            os.environ.clear()
+            os.environ.update(env)
+            forget_cached_state()
+            try:
+                status = run_line(line)
+            except SystemExit as exit:
+                status = exit_status(exit)
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            if status != 0:
+                print(f"{sys.argv[0]}: {line}: exited with status {status}",
+                      file=sys.stderr)
+                failed = True
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        forget_cached_state()
+    return 1 if failed else 0
+
+
+def forget_cached_state() -> None:
+    """
+    Forgets the language and the connections cached by the last command,
+    since they depend on its environment.
+    """
+    from sensibility.language import language
+    from sensibility.miner import connection
+
+    language.forget()
+    for cached in (connection.get_redis_client,
+                   connection.get_sqlite3_connection,
+                   connection.get_github_client,
+                   connection.get_github_token):
+        cached.cache_clear()
+
+
+def run_line(line: str) -> int:
+    words, stdin_path, stdout_path = parse_redirections(shlex.split(line))
+    args = parse_args(['sensibility'] + words)
+    if not args.subcommand:
+        usage_error("No command given:", line)
+    if args.language is not None:
+        os.environ.update(SENSIBILITY_LANGUAGE=args.language)
+
+    bin, argv = get_bin_and_argv(args.subcommand)
+    if not bin.exists():
+        usage_error("Unknown executable:", bin)
+
+    with ExitStack() as stack:
+        # Text files, which also have a binary .buffer.
+        stdin: TextIO = io.TextIOWrapper(io.BytesIO())
+        if stdin_path is not None:
+            stdin = stack.enter_context(open(stdin_path))
+        stdout: TextIO = sys.stdout
+        if stdout_path is not None:
+            stdout = stack.enter_context(open(stdout_path, 'w'))
+
+        if not is_python_script(bin):
+            sys.stdout.flush()
+            return subprocess.run(
+                argv, executable=str(bin.absolute()), env=dict(os.environ),
+                stdin=stdin if stdin_path else subprocess.DEVNULL,
+                stdout=stdout if stdout_path else None,
+            ).returncode
+
+        saved_stdin, saved_stdout = sys.stdin, sys.stdout
+        sys.stdin, sys.stdout = stdin, stdout
+        try:
+            return run_in_process(bin, argv)
+        finally:
+            sys.stdin, sys.stdout = saved_stdin, saved_stdout
+
+
+def parse_redirections(words: List[str]
+                       ) -> Tuple[List[str], Optional[str], Optional[str]]:
+    """
+    Separates redirections of standard input and output from the command.
+
+    >>> parse_redirections(['where', 'sources', '<', 'in.txt', '>', 'out.txt'])
+    (['where', 'sources'], 'in.txt', 'out.txt')
+    >>> parse_redirections(['sources', 'path', '<hashes'])
+    (['sources', 'path'], 'hashes', None)
+    >>> parse_redirections(['sources', 'path'])
+    (['sources', 'path'], None, None)
+    """
+    command: List[str] = []
+    stdin_path = stdout_path = None
+    words = list(words)
+    while words:
+        word = words.pop(0)
+        if word[:1] not in ('<', '>'):
+            command.append(word)
+            continue
+        # Allow both "< file" and "<file".
+        path = word[1:]
+        if not path:
+            if not words:
+                usage_error(f"Missing file after {word!r}")
+            path = words.pop(0)
+        if word[0] == '<':
+            stdin_path = path
+        else:
+            stdout_path = path
+    return command, stdin_path, stdout_path
+
+
+def exit_status(exit: SystemExit) -> int:
+    """
+    Converts the argument of sys.exit() to an exit status.
+    """
+    if exit.code is None:
+        return 0
+    elif isinstance(exit.code, int):
+        return exit.code
+    print(exit.code, file=sys.stderr)
+    return 1
+
+
 def list_commands() -> None:
     print("Please specify a subcommand:\n", file=sys.stderr)
     for bin in bin_dir.rglob('*'):
@@ -89,6 +261,14 @@ def is_executable(path: Path) -> bool:
     return os.access(path, os.X_OK)
 
 
+def is_python_script(path: Path) -> bool:
+    """
+    Whether the executable is a Python script (judging by its shebang).
+    """
+    with open(path, 'rb') as executable:
+        return b'python' in executable.readline()
+
+
 def parse_args(argv=sys.argv):
     """
     Roll my own parse because argparse will swallow up arguments that don't
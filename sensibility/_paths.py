@@ -27,7 +27,6 @@ from sensibility.language import language
 # Get paths for here and repository root dir.
 HERE = Path(__file__).parent
 REPOSITORY_ROOT = HERE.parent
-assert (REPOSITORY_ROOT / '.git').exists()
 
 # Directories for storing data and models.
 DATA_DIR = REPOSITORY_ROOT / 'data'
@@ -60,6 +59,14 @@ def get_training_set_path(partition: int) -> Path:
     return get_partitions_path() / str(partition) / 'training'
 
 
+def get_packed_vectors_path(partition: int) -> Path:
+    return get_partitions_path() / str(partition) / 'vectors'
+
+
+def get_shards_path(partition: int) -> Path:
+    return get_partitions_path() / str(partition) / 'shards'
+
+
 def get_test_set_path(partition: int) -> Path:
     return get_partitions_path() / str(partition) / 'test'
 
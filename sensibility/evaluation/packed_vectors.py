@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Stores many vectors contiguously in one flat, memory-mapped file.
+
+A packed vector store is a directory with two files:
+
+    tokens      every vocabulary index of every file, one byte each,
+                concatenated in the order they were packed.
+    index.tsv   one line per file: filehash, start, length
+
+Accessing a file returns a view into the memory-mapped tokens; nothing is
+copied, and concurrent processes reading the same store share the OS page
+cache.
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import (IO, Dict, Iterable, Iterator, List, Mapping, Optional,
+                    Tuple)
+
+import numpy as np
+
+from ..source_vector import SourceVector
+
+TOKENS_FILENAME = 'tokens'
+INDEX_FILENAME = 'index.tsv'
+
+
+class PackedVectors(Mapping[str, np.ndarray]):
+    """
+    Read-only access to a packed vector store.
+    """
+
+    def __init__(self, tokens: np.ndarray,
+                 index: Dict[str, Tuple[int, int]]) -> None:
+        self.tokens = tokens
+        self.index = index
+
+    def length_of_vectors(self, hashes: Iterable[str]) -> int:
+        """
+        Determines the total number of tokens in the given hashes.
+        Like Vectors.length_of_vectors(), unknown hashes are ignored.
+        """
+        index = self.index
+        return sum(index[fh][1] for fh in hashes if fh in index)
+
+    def disconnect(self) -> None:
+        # Drop our reference to the mmap; it's closed once all the views
+        # handed out have been garbage collected.
+        self.tokens = np.zeros(0, dtype=np.uint8)
+
+    def __getitem__(self, filehash: str) -> np.ndarray:
+        start, length = self.index[filehash]
+        return self.tokens[start:start + length]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @classmethod
+    def from_path(cls, path: Path) -> 'PackedVectors':
+        tokens_path = path / TOKENS_FILENAME
+        # np.memmap() refuses to map an empty file.
+        if tokens_path.stat().st_size == 0:
+            tokens = np.zeros(0, dtype=np.uint8)
+        else:
+            tokens = np.memmap(os.fspath(tokens_path), dtype=np.uint8, mode='r')
+        with open(path / INDEX_FILENAME) as index_file:
+            index = dict(parse_index(index_file))
+        return cls(tokens, index)
+
+    @classmethod
+    def from_vectors(cls, vectors: Mapping[str, SourceVector],
+                     filehashes: Iterable[str]) -> 'PackedVectors':
+        """
+        Packs the given file vectors in memory. Unknown hashes are ignored.
+        """
+        chunks: List[bytes] = []
+        index: Dict[str, Tuple[int, int]] = {}
+        offset = 0
+        for filehash in filehashes:
+            try:
+                byte_string = vectors[filehash].to_bytes()
+            except KeyError:
+                continue
+            chunks.append(byte_string)
+            index[filehash] = offset, len(byte_string)
+            offset += len(byte_string)
+        return cls(np.frombuffer(b''.join(chunks), dtype=np.uint8), index)
+
+
+class PackedVectorsWriter:
+    """
+    Creates a new packed vector store, one vector at a time.
+
+    Use as a context manager; the store is only moved to its final path once
+    the writer exits cleanly. Otherwise, the incomplete store is removed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.temporary_path = path.with_name(path.name + '.incomplete')
+        self.offset = 0
+        self._tokens_file: Optional[IO[bytes]] = None
+        self._index_file: Optional[IO[str]] = None
+
+    def __enter__(self) -> 'PackedVectorsWriter':
+        assert not self.path.exists(), f"Refusing to overwrite {self.path}"
+        self.temporary_path.mkdir(parents=True, exist_ok=True)
+        self._tokens_file = open(self.temporary_path / TOKENS_FILENAME, 'wb')
+        self._index_file = open(self.temporary_path / INDEX_FILENAME, 'w')
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        assert self._tokens_file is not None and self._index_file is not None
+        try:
+            self._tokens_file.close()
+            self._index_file.close()
+            if exc_type is None:
+                self.temporary_path.rename(self.path)
+        finally:
+            if self.temporary_path.exists():
+                shutil.rmtree(self.temporary_path)
+
+    def add(self, filehash: str, vector: SourceVector) -> None:
+        """
+        Append one file's vector to the store.
+        """
+        assert self._tokens_file is not None and self._index_file is not None
+        byte_string = vector.to_bytes()
+        self._tokens_file.write(byte_string)
+        print(filehash, self.offset, len(byte_string),
+              sep='\t', file=self._index_file)
+        self.offset += len(byte_string)
+
+
+def pack_vectors(vectors: Mapping[str, SourceVector],
+                 filehashes: Iterable[str], path: Path) -> None:
+    """
+    Copies the given file vectors into a new packed vector store at path.
+    Like PackedVectors.from_vectors(), unknown hashes are ignored.
+    """
+    with PackedVectorsWriter(path) as writer:
+        for filehash in filehashes:
+            try:
+                vector = vectors[filehash]
+            except KeyError:
+                continue
+            writer.add(filehash, vector)
+
+
+def load_packed_vectors(path: Path, filehashes: Iterable[str], *,
+                        allow_sqlite: bool=False) -> PackedVectors:
+    """
+    Returns the given files as packed vectors: either by memory-mapping a
+    packed vector store, or, with allow_sqlite, by packing them from an
+    SQLite3 vector database. The latter loads every token of the files into
+    memory, so it must be asked for.
+    """
+    if path.is_dir():
+        return PackedVectors.from_path(path)
+    if not allow_sqlite:
+        raise ValueError(f"{path} is not a packed vector store; create one "
+                         "with `sensibility sources pack-vectors`, or allow "
+                         "loading every vector into memory")
+    from .vectors import Vectors
+    vectors = Vectors.from_filename(path)
+    try:
+        return PackedVectors.from_vectors(vectors, filehashes)
+    finally:
+        vectors.disconnect()
+
+
+def parse_index(lines: Iterable[str]) -> Iterator[Tuple[str, Tuple[int, int]]]:
+    """
+    Parses the lines of an index file.
+
+    >>> dict(parse_index(['abc\\t0\\t3\\n', 'def\\t3\\t7\\n']))
+    {'abc': (0, 3), 'def': (3, 7)}
+    """
+    for line in lines:
+        filehash, start, length = line.split()
+        yield filehash, (int(start), int(length))
@@ -22,13 +22,18 @@ import os
 import sqlite3
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Iterator, MutableMapping, Optional, Union
+from typing import Iterable, Iterator, MutableMapping, Optional, Tuple, Union
+
+from more_itertools import chunked  # type: ignore
 
 from .._paths import get_vectors_path
 from ..lexical_analysis import Lexeme
 from ..source_vector import SourceVector
 
 
+# How many vectors to insert per transaction, when inserting many vectors.
+CHUNK_SIZE = 1024
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS vector (
     filehash    TEXT PRIMARY KEY,
@@ -79,10 +84,15 @@ class Vectors(MutableMapping[str, SourceVector]):
         self.conn.close()
 
     def __len__(self) -> int:
-        raise NotImplementedError
+        count, = self.conn.execute('SELECT COUNT(*) FROM vector').fetchone()
+        return count
 
     def __iter__(self) -> Iterator[str]:
-        raise NotImplementedError
+        """
+        Yields the filehash of every vector in the database.
+        """
+        for filehash, in self.conn.execute('SELECT filehash FROM vector'):
+            yield filehash
 
     def __getitem__(self, filehash: str) -> SourceVector:
         cur = self.conn.execute("""
@@ -105,6 +115,19 @@ class Vectors(MutableMapping[str, SourceVector]):
                      VALUES (?, ?)
              """, (filehash, byte_string))
 
+    def insert_many(self, items: Iterable[Tuple[str, SourceVector]],
+                    chunk_size: int=CHUNK_SIZE) -> None:
+        """
+        Inserts many (filehash, vector) pairs, in one transaction per chunk.
+        """
+        for chunk in chunked(items, chunk_size):
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO vector(filehash, array)
+                         VALUES (?, ?)
+                 """, [(filehash, vector.to_bytes())
+                       for filehash, vector in chunk])
+
     def __delitem__(self):
         raise NotImplementedError
 
@@ -87,6 +87,18 @@ class Language(ABC):
         """
         return self.summarize_tokens(self._as_tokens(source))
 
+    def check_and_summarize(self, source: Union[str, bytes]) -> SourceSummary:
+        """
+        Summarizes a syntactically-valid source file. Raises SyntaxError if
+        the file is not.
+
+        Languages whose backend can do both in one pass should override
+        this.
+        """
+        if not self.check_syntax(source):
+            raise SyntaxError('file does not compile')
+        return self.summarize(source)
+
     def vocabularize(self, source: Union[SourceCode, Tokens]) -> Iterable[str]:
         """
         Produces a stream of normalized types (string representations of
@@ -259,6 +271,9 @@ class LanguageProxy(Language):
     def summarize_tokens(self, *args):
         return self.wrapped_language.summarize_tokens(*args)
 
+    def check_and_summarize(self, *args):
+        return self.wrapped_language.check_and_summarize(*args)
+
     def vocabularize_tokens(self, *args, **kwargs):
         return self.wrapped_language.vocabularize_tokens(*args, **kwargs)
 
@@ -31,7 +31,8 @@ import javac_parser
 
 from .. import Language, SourceSummary
 from ...lexical_analysis import Lexeme, Location, Position, Token
-from ...vocabulary import NoSourceRepresentationError, Vocabulary, Vind
+from ...vocabulary import (LazyVocabulary, NoSourceRepresentationError,
+                           Vocabulary, Vind)
 
 
 here = Path(__file__).parent
@@ -87,16 +88,6 @@ def to_str(source: Union[str, bytes, IO[bytes]]) -> str:
         raise NotImplementedError
 
 
-class LazyVocabulary:
-    def __init__(self, fn):
-        self.fn = fn
-
-    def __get__(self, obj, value):
-        if not hasattr(self, 'value'):
-            self.value = self.fn()
-        return self.value
-
-
 class JavaToken(Token):
     """
     HACK: javac_parser has some... interesting ideas about normalization.
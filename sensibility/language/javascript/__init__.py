@@ -28,7 +28,7 @@ from typing import cast
 
 from .. import Language, SourceSummary
 from ...lexical_analysis import Token, Lexeme, Location, Position
-from ...vocabulary import Vocabulary
+from ...vocabulary import LazyVocabulary, Vocabulary
 from .esprima_interface import Server, get_server, tokenize, check_syntax
 
 
@@ -41,7 +41,9 @@ class JavaScript(Language):
     """
 
     extensions = {'.js'}
-    vocabulary = Vocabulary.from_json_file(here / 'vocabulary.json')
+    vocabulary = cast(Vocabulary, LazyVocabulary(
+        lambda: Vocabulary.from_json_file(here / 'vocabulary.json')
+    ))
 
     def tokenize(self, source: Union[str, bytes, IO[bytes]]) -> Sequence[Token]:
         """
@@ -23,12 +23,12 @@ from keyword import iskeyword
 from pathlib import Path
 from typing import (
     Any, AnyStr, Callable, IO, Iterable, Optional, Sequence, Tuple, Union,
-    overload,
+    cast, overload,
 )
 
 from .. import Language, SourceSummary
 from ...lexical_analysis import Lexeme, Location, Position, Token
-from ...vocabulary import Vocabulary
+from ...vocabulary import LazyVocabulary, Vocabulary
 
 
 here = Path(__file__).parent
@@ -40,8 +40,9 @@ class Python(Language):
     """
 
     extensions = {'.py'}
-    vocabulary = Vocabulary.from_json_file(Path(__file__).parent /
-                                           'vocabulary.json')
+    vocabulary = cast(Vocabulary, LazyVocabulary(
+        lambda: Vocabulary.from_json_file(here / 'vocabulary.json')
+    ))
 
     def tokenize(self, source: Union[str, bytes, IO[bytes]]) -> Sequence[Token]:
         """
@@ -116,6 +117,25 @@ class Python(Language):
             child_pid, status = os.waitpid(pid, 0)
             return status == 0
 
+    def check_and_summarize(self, source: Union[str, bytes]) -> SourceSummary:
+        r"""
+        The summary needs the tokens, which compile() does not expose, so
+        the file is still tokenized and compiled separately. Tokenizing
+        first rejects a file that does not even tokenize without forking to
+        compile it (see check_syntax()).
+
+        >>> python.check_and_summarize('import sys\n')
+        SourceSummary(sloc=1, n_tokens=3)
+        >>> python.check_and_summarize('import java.util.*;')
+        Traceback (most recent call last):
+        ...
+        SyntaxError: file does not compile
+        """
+        summary = self.summarize(source)
+        if not self.check_syntax(source):
+            raise SyntaxError('file does not compile')
+        return summary
+
     def summarize_tokens(self, source: Iterable[Token]) -> SourceSummary:
         r"""
         Calculates the word count of a Python source.
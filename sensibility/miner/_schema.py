@@ -92,9 +92,6 @@ repository_source = Table(
     Column('hash', String, primary_key=True),
     Column('path', String, primary_key=True),
 
-    # Makes accessing a filehash's information take O(log n) time.
-    Index('idx_filehash', 'hash'),
-
     ForeignKeyConstraint(*_to('repository', 'owner', 'name'),
                          **cascade_all),
     ForeignKeyConstraint(*_to('source_file', 'hash'),
@@ -107,6 +104,9 @@ repository_source = Table(
     # )
 )
 
+# Makes accessing a filehash's information take O(log n) time.
+repository_source_by_hash = Index('idx_filehash', repository_source.c.hash)
+
 source_summary = Table(
     'source_summary', metadata,
     Column('hash', String, primary_key=True),
@@ -22,12 +22,16 @@ Proxies to the common connections.
 import sqlite3
 import warnings
 from functools import lru_cache
-
-import github3
-import redis
+from typing import TYPE_CHECKING
 
 from .._paths import get_sources_path
 
+# github3 and redis are slow to import, and most users of this module need
+# neither; import them when the first client is created.
+if TYPE_CHECKING:
+    import github3
+    import redis
+
 __all__ = [
     'get_github_client', 'get_github_token',
     'get_redis_client',
@@ -36,10 +40,11 @@ __all__ = [
 
 
 @lru_cache(maxsize=1)
-def get_redis_client() -> redis.StrictRedis:
+def get_redis_client() -> 'redis.StrictRedis':
     """
     The default Redis client.
     """
+    import redis
     return redis.StrictRedis(db=0)
 
 
@@ -61,10 +66,11 @@ def get_sqlite3_connection() -> sqlite3.Connection:
 
 
 @lru_cache(maxsize=1)
-def get_github_client() -> github3.GitHub:
+def get_github_client() -> 'github3.GitHub':
     """
     The default GitHub connection.
     """
+    import github3
     return github3.login(token=str(get_github_token()))
 
 
@@ -20,9 +20,12 @@ Access to the corpus.
 """
 
 import os
+from contextlib import contextmanager
 from pathlib import Path, PurePosixPath
-from typing import Any, Dict, Iterator, Set, Tuple, Union
+from typing import (Any, Dict, Iterable, Iterator, Sequence, Set, Tuple,
+                    Union)
 
+from more_itertools import chunked  # type: ignore
 from sqlalchemy import MetaData, create_engine, event  # type: ignore
 from sqlalchemy.engine import Engine  # type: ignore
 from sqlalchemy.sql import select, text  # type: ignore
@@ -30,12 +33,24 @@ from sqlalchemy.sql import select, text  # type: ignore
 from sensibility.language import SourceSummary
 
 from ._schema import (eligible_source, failure, meta, metadata, repository,
-                      repository_source, source_file, source_summary)
+                      repository_source, repository_source_by_hash,
+                      source_file, source_summary)
 from .connection import get_sqlite3_path
 from .models import (MockSourceFile, RepositoryID, RepositoryMetadata,
                      SourceFile, SourceFileInRepository)
 
 
+# How many rows to insert per transaction, when inserting many rows.
+CHUNK_SIZE = 1024
+
+# How many rows to fetch at once, when streaming many rows.
+FETCH_SIZE = 1024
+
+# How many filehashes to look up per query; SQLite allows at most 999
+# parameters per statement.
+HASHES_PER_QUERY = 512
+
+
 class NewCorpusError(Exception):
     """
     Raised when querying an empty corpus.
@@ -165,10 +180,17 @@ class Corpus:
         Yields source files eligible for training, validation, and testing
         (source and filehash).
         """
-        query = select([source_file.c.source])\
-            .select_from(source_file.join(eligible_source))
+        for filehash, source in self.stream_sources(eligible=True):
+            yield SourceFile(source, filehash)
+
+    @property
+    def eligible_hashes(self) -> Iterator[str]:
+        """
+        Yields the filehashes of the eligible sources, without their source.
+        """
+        query = select([eligible_source.c.hash])
         for row in self.conn.execute(query):
-            yield SourceFile(row[source_file.c.source])
+            yield row[eligible_source.c.hash]
 
     @property
     def source_summaries(self) -> Iterator[Tuple[str, SourceSummary]]:
@@ -189,12 +211,40 @@ class Corpus:
         Returns ALL sources including their repository and their repository
         path.
         """
-        query = select([repository_source.c.owner, repository_source.c.name,
-                        repository_source.c.path, source_file.c.source])\
-            .select_from(repository_source.join(source_file))
-        for owner, name, pathstr, source in self.conn.execute(query):
+        query = '''
+            SELECT owner, name, path, source
+              FROM repository_source JOIN source_file USING (hash)
+        '''
+        for owner, name, pathstr, source in self._fetch(query):
             yield owner, name, PurePosixPath(pathstr), source
 
+    def stream_sources(self, filehashes: Iterable[str] = None, *,
+                       eligible: bool = False,
+                       fetch_size: int = FETCH_SIZE) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yields (filehash, source) pairs for every file in the corpus, or only
+        for the given filehashes, in no particular order. Unknown filehashes
+        are skipped. With eligible=True, only eligible sources are yielded.
+
+        Rows are fetched fetch_size at a time from a raw SQLite3 cursor, and
+        the filehash is the one stored in the database; use this rather than
+        get_source() or eligible_sources to read large parts of the corpus.
+        """
+        query = '''
+            SELECT source_file.hash, source_file.source FROM source_file
+        '''
+        if eligible:
+            query += ' JOIN eligible_source USING (hash)'
+        if filehashes is None:
+            yield from self._fetch(query, fetch_size=fetch_size)
+            return
+        for chunk in chunked(filehashes, HASHES_PER_QUERY):
+            placeholders = ', '.join('?' * len(chunk))
+            yield from self._fetch(
+                f'{query} WHERE source_file.hash IN ({placeholders})', chunk,
+                fetch_size=fetch_size
+            )
+
     def __getitem__(self, filehash: str) -> bytes:
         """
         Returns a file from the corpus.
@@ -240,6 +290,25 @@ class Corpus:
         else:
             trans.commit()
 
+    def insert_source_files_from_repo(self, entries: Iterable[SourceFileInRepository],
+                                      chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        Inserts many source files, as with insert_source_file_from_repo(),
+        in one transaction per chunk of files.
+        """
+        for chunk in chunked(entries, chunk_size):
+            with self.conn.begin():
+                self.conn.execute((source_file.insert()
+                                   .prefix_with('OR IGNORE', dialect='sqlite')),
+                                  [dict(source=entry.source_file.source,
+                                        hash=entry.filehash)
+                                   for entry in chunk])
+                self.conn.execute(repository_source.insert(),
+                                  [dict(owner=entry.owner, name=entry.name,
+                                        hash=entry.filehash,
+                                        path=str(entry.path))
+                                   for entry in chunk])
+
     def insert_source_summary(self, filehash: str, summary: SourceSummary) -> None:
         """
         Insert the word count into the source summary.
@@ -248,6 +317,23 @@ class Corpus:
                           hash=filehash,
                           sloc=summary.sloc, n_tokens=summary.n_tokens)
 
+    def insert_source_summaries(self, summaries: Iterable[Tuple[str, SourceSummary]],
+                                chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        Inserts many (filehash, summary) pairs, in one transaction per chunk.
+        Files that were already summarized (e.g., by an interrupted run) are
+        skipped.
+        """
+        insert = source_summary.insert().prefix_with('OR IGNORE',
+                                                     dialect='sqlite')
+        for chunk in chunked(summaries, chunk_size):
+            with self.conn.begin():
+                self.conn.execute(insert, [
+                    dict(hash=filehash,
+                         sloc=summary.sloc, n_tokens=summary.n_tokens)
+                    for filehash, summary in chunk
+                ])
+
     def insert_failure(self, filehash: str, reason: str = None,
                        ignore: bool = False) -> None:
         """
@@ -259,6 +345,39 @@ class Corpus:
                            if ignore else failure.insert()),
                           hash=filehash, reason=reason)
 
+    def insert_failures(self, filehashes: Iterable[str], reason: str = None,
+                        chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        Inserts many failures, as with insert_failure(), in one transaction
+        per chunk. Files that already failed are skipped.
+        """
+        insert = failure.insert().prefix_with('OR IGNORE', dialect='sqlite')
+        for chunk in chunked(filehashes, chunk_size):
+            with self.conn.begin():
+                self.conn.execute(insert, [dict(hash=filehash, reason=reason)
+                                           for filehash in chunk])
+
+    @contextmanager
+    def deferred_index(self) -> Iterator[None]:
+        """
+        Drops the index of repository sources by filehash until the end of
+        the block. Building the index once, after a bulk insert, is much
+        faster than updating it on every insert.
+
+        The index may already be missing (e.g., after a crash inside the
+        block), or rebuilt by another process in the meantime.
+        """
+        # Index.drop() and Index.create() have no checkfirst in SQLAlchemy
+        # 1.3, so use SQLite's IF [NOT] EXISTS instead.
+        index = repository_source_by_hash
+        columns = ', '.join(column.name for column in index.columns)
+        self.engine.execute(f'DROP INDEX IF EXISTS {index.name}')
+        try:
+            yield
+        finally:
+            self.engine.execute(f'CREATE INDEX IF NOT EXISTS {index.name} '
+                                f'ON {index.table.name} ({columns})')
+
     def get_source(self, filehash: str) -> bytes:
         """
         Returns the source code for one file.
@@ -330,6 +449,22 @@ class Corpus:
         for row in self.conn.execute(query):
             yield row[repository_source.c.hash]
 
+    def _fetch(self, query: str, parameters: Sequence[Any] = (),
+               fetch_size: int = FETCH_SIZE) -> Iterator[Tuple[Any, ...]]:
+        """
+        Yields the rows of a query, fetching many rows at a time from a raw
+        SQLite3 cursor, bypassing SQLAlchemy's row-at-a-time result proxies.
+        """
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.execute(query, parameters)
+            rows = cursor.fetchmany(fetch_size)
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany(fetch_size)
+        finally:
+            cursor.close()
+
     def _initialize_sqlite3(self, writable: bool) -> None:
         """
         Set some pragmas for initially creating the SQLite3 database.
@@ -22,109 +22,251 @@ TODO: use GHTorrent instead of GitHub's alpha GraphQL API.
 """
 
 import datetime
-import io
 import logging
-import time
+import tempfile
+import threading
 import zipfile
+from contextlib import ExitStack
 from pathlib import PurePosixPath
-from typing import Any, Dict, Iterator, Tuple, Union, Optional
+from typing import (TYPE_CHECKING, IO, Any, Dict, Iterable, Iterator, List,
+                    Optional, Sequence, Tuple, Union)
 
 import dateutil.parser
 import requests
+import requests.adapters
+from more_itertools import chunked  # type: ignore
 
 from sensibility.language import language
 
 from .connection import get_github_token, get_redis_client
-from .corpus import Corpus, NewCorpusError
+from .corpus import CHUNK_SIZE, Corpus, NewCorpusError
 from .models import (RepositoryID, RepositoryMetadata, SourceFile,
                      SourceFileInRepository)
 from .names import DOWNLOAD_QUEUE
-from .rate_limit import seconds_until, wait_for_rate_limit
-from .rqueue import Queue, WorkQueue
+from .rate_limit import RateLimiter
+from .rqueue import LEASE, Queue, WorkQueue
+
+if TYPE_CHECKING:
+    import redis
 
 QUEUE_ERRORS = DOWNLOAD_QUEUE.errors
+API_URL = 'https://api.github.com'
+# How many repositories' metadata to fetch in one GraphQL query.
+BATCH_SIZE = 25
 logger = logging.getLogger('download_worker')
 
+# Zipballs are kept in memory up to this size; larger ones go to disk.
+SPOOL_SIZE = 32 * 1024 * 1024
+# How many bytes of the zipball to read from the network at once.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# How long a worker waits for a job before checking whether to stop, in
+# seconds.
+POLL_TIMEOUT = 1
+
 
 class Downloader:
-    def __init__(self) -> None:
-        redis_client = get_redis_client()
-        self.client = GitHubGraphQLClient()
-        self.worker = WorkQueue(Queue(DOWNLOAD_QUEUE, redis_client))
+    """
+    Downloads repositories from the download queue into the corpus, in a
+    number of worker threads.
+
+    The threads share one pool of HTTP connections and one rate limiter per
+    GitHub rate limit. Each thread has its own connection to the corpus,
+    but only one thread writes to the corpus at a time; hence, the corpus
+    cannot be an in-memory database, which exists in one connection only.
+    """
+
+    def __init__(self, *, workers: int = 1, batch_size: int = BATCH_SIZE,
+                 api_url: str = API_URL,
+                 token: str = None, redis_client: 'redis.StrictRedis' = None,
+                 corpus: Corpus = None) -> None:
+        if redis_client is None:
+            redis_client = get_redis_client()
+        if token is None:
+            token = get_github_token()
+        if corpus is None:
+            corpus = Corpus(writable=True)
+        if corpus.engine.url.database in (None, '', ':memory:'):
+            raise ValueError('Cannot share an in-memory corpus between '
+                             'threads')
+
+        self.workers = workers
+        self.batch_size = batch_size
+        self.api_url = api_url
+        self.session = create_session(pool_size=workers)
+        self.rate_limit = RateLimiter()
+        self.client = GitHubGraphQLClient(session=self.session, token=token,
+                                          endpoint=f"{api_url}/graphql")
+        self.queue = Queue(DOWNLOAD_QUEUE, redis_client)
         self.errors = Queue(QUEUE_ERRORS, redis_client)
-        self.corpus = Corpus(writable=True)
-        self._headers = {
-            'User-Agent': 'eddieantonio-sensibility/0.3.0',
-            'Authorization': f"token {get_github_token()}"
-        }
+        self._headers = {'Authorization': f"token {token}"}
+        self._corpus_url = str(corpus.engine.url)
+        self._local = threading.local()
+        self._local.corpus = corpus
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
 
         # Ensure the corpus is initialized.
         # If it's initialized with a different language, bail.
         try:
-            lang_name = self.corpus.language
+            lang_name = corpus.language
         except NewCorpusError:
-            import datetime
             now = datetime.datetime.utcnow()
-            self.corpus.set_metadata(language=language.name, mined=now)
+            corpus.set_metadata(language=language.name, mined=now)
         else:
             assert lang_name == language.name, (
                 f"Refusing to overwrite {lang_name} corpus"
             )
 
-    def loop_forever(self) -> None:
-        logger.info("Downloader queue: %s", self.worker.name)
-        while True:
-            job = self.get_a_job()
+    @property
+    def corpus(self) -> Corpus:
+        """
+        The corpus, connected once per thread.
+        """
+        try:
+            return self._local.corpus
+        except AttributeError:
+            self._local.corpus = Corpus(url=self._corpus_url, writable=True)
+            return self._local.corpus
+
+    def loop_forever(self, defer_index: bool = False) -> None:
+        """
+        Downloads repositories in self.workers threads, until interrupted.
+        Another thread keeps their claims on their jobs alive. When
+        interrupted, the workers finish their current jobs first.
+
+        With defer_index, the index of sources by hash is built once, when
+        interrupted, rather than on every insert (see
+        Corpus.deferred_index()).
+        """
+        workers = [WorkQueue(self.queue) for _ in range(self.workers)]
+        threads = [threading.Thread(target=self.work_forever, args=(worker,),
+                                    daemon=True)
+                   for worker in workers]
+        threads.append(threading.Thread(target=self.keep_alive,
+                                        args=(list(zip(workers, threads)),),
+                                        daemon=True))
+        with ExitStack() as stack:
+            if defer_index:
+                stack.enter_context(self.corpus.deferred_index())
+            for thread in threads:
+                thread.start()
             try:
-                self.do_job(job)
-            except Exception:
-                # "You had ONE job!"
-                self.log_error(job)
+                for thread in threads:
+                    thread.join()
             finally:
-                self.acknowledge(job)
+                # Nothing may be inserted once the index is rebuilt.
+                self.stop()
+                for thread in threads:
+                    thread.join()
 
-    def get_a_job(self) -> str:
+    def stop(self) -> None:
         """
-        This will block until a job is available.
-        (to place a job, use bin/enqueue-job)
+        Tells every thread to stop after its current jobs.
         """
-        # TODO: if there already is a job in the worker queue, then, fetch
-        # this job.
-        return self.worker.get().decode('UTF-8')
+        self._stopping.set()
 
-    def acknowledge(self, job: str) -> None:
+    def keep_alive(self, workers: Iterable[Tuple[WorkQueue, threading.Thread]]
+                   ) -> None:
         """
-        This must be done before getting another job.
+        Renews the leases of the workers whose threads are still running,
+        and requeues the jobs of workers (of any downloader) whose leases
+        have ended, until stopped. The jobs of a worker whose thread died
+        are thus requeued once its lease ends.
         """
-        return self.worker.acknowledge(job)
+        while not self._stopping.is_set():
+            try:
+                for worker, thread in workers:
+                    if thread.is_alive():
+                        worker.heartbeat()
+                requeued = self.queue.reap(LEASE)
+                if requeued:
+                    logger.info('Requeued %d abandoned jobs', requeued)
+            except Exception:
+                logger.exception('Could not renew leases')
+            self._stopping.wait(LEASE / 3)
+
+    def work_forever(self, worker: WorkQueue = None) -> None:
+        if worker is None:
+            worker = WorkQueue(self.queue)
+        logger.info("Downloader queue: %s", worker.name)
+        while not self._stopping.is_set():
+            # This will block until a job is available, or for POLL_TIMEOUT.
+            # (to place a job, use bin/enqueue-job)
+            jobs = [job.decode('UTF-8')
+                    for job in worker.get_many(self.batch_size,
+                                               timeout=POLL_TIMEOUT)]
+            if not jobs:
+                continue
+            try:
+                self.do_jobs(jobs)
+            finally:
+                # This must be done before getting another job.
+                worker.acknowledge_many(jobs)
 
-    def do_job(self, job: str) -> None:
-        repo_id = RepositoryID.parse(job)
+    def do_jobs(self, jobs: Sequence[str]) -> None:
+        """
+        Fetches the metadata of all jobs in one query, then downloads each
+        repository. Errors are logged per job.
+        """
+        repo_ids: Dict[str, RepositoryID] = {}
+        for job in jobs:
+            try:
+                repo_ids[job] = RepositoryID.parse(job)
+            except ValueError:
+                self.log_error(job)
+        if not repo_ids:
+            return
 
-        logger.info('Fetching %s', repo_id)
-        repo = self.client.fetch_repository(repo_id)
-        self.insert_repository(repo)
+        logger.info('Fetching %s', ', '.join(repo_ids))
+        try:
+            metadata = self.client.fetch_repositories(list(repo_ids.values()))
+        except Exception:
+            for job in repo_ids:
+                self.log_error(job)
+            return
 
-        for source_file in self.download(repo):
-            self.insert_source_file(source_file)
+        for job, repo in zip(repo_ids, metadata):
+            try:
+                if repo is None:
+                    raise ValueError(f'Could not fetch info for {job}')
+                self.mine(repo)
+            except Exception:
+                # "You had ONE job!"
+                self.log_error(job)
 
-    def download(self, repo: RepositoryMetadata) -> Iterator[SourceFileInRepository]:
+    def mine(self, repo: RepositoryMetadata) -> None:
+        """
+        Downloads the repository and inserts it and its sources.
         """
-        Downloads files for the given repository revision.
+        with self.fetch_zipball(repo) as zip_file, \
+                zipfile.ZipFile(zip_file) as repo_zip:
+            with self._write_lock:
+                self.insert_repository(repo)
+            # Decompress and hash each chunk before taking the lock, so that
+            # only the inserts themselves wait for other threads.
+            for chunk in chunked(self.extract_sources(repo_zip), CHUNK_SIZE):
+                with self._write_lock:
+                    self.insert_source_files(
+                        SourceFileInRepository(repo, source_file, path)
+                        for path, source_file in chunk
+                    )
+
+    def fetch_zipball(self, repo: RepositoryMetadata) -> IO[bytes]:
+        """
+        Downloads the zipball of the given repository revision to a
+        temporary file (see spool()).
         """
         url = self.zip_url_for(repo)
 
         logger.debug('Downloading %s', url)
-        wait_for_rate_limit()
-        resp = requests.get(url, headers=self._headers)
+        self.rate_limit.acquire()
+        resp = self.session.get(url, headers=self._headers, stream=True)
+        # The API redirects to the download; only its response counts
+        # against the rate limit.
+        for response in (*resp.history, resp):
+            self.rate_limit.update(response.headers)
         resp.raise_for_status()
-
-        # Open zip file
-        fake_file = io.BytesIO(resp.content)
-        with zipfile.ZipFile(fake_file) as repo_zip:
-            # Iterate through all javascript files
-            for path, source in self.extract_sources(repo_zip):
-                yield SourceFileInRepository(repo, SourceFile(source), path)
+        return spool(resp)
 
     def log_error(self, job: str) -> None:
         logger.exception('Error downloading "%s"', job)
@@ -134,23 +276,27 @@ class Downloader:
         logger.debug('Insering %s', repo)
         self.corpus.insert_repository(repo)
 
-    def insert_source_file(self, entry: SourceFileInRepository) -> None:
-        logger.debug('  > %s', entry.path)
-        self.corpus.insert_source_file_from_repo(entry)
+    def insert_source_files(self, entries: Iterable[SourceFileInRepository]) -> None:
+        def log(entries):
+            for entry in entries:
+                logger.debug('  > %s', entry.path)
+                yield entry
+        self.corpus.insert_source_files_from_repo(log(entries))
 
-    def extract_sources(self, archive: zipfile.ZipFile) -> Iterator[Tuple[PurePosixPath, bytes]]:
+    @staticmethod
+    def extract_sources(archive: zipfile.ZipFile) -> Iterator[Tuple[PurePosixPath, SourceFile]]:
         """
-        Extracts sources (with the given extension) from a zip file.
+        Extracts sources (with the given extension) from a zip file, hashing
+        each one as it is decompressed. Other entries are never decompressed.
         """
-        for path in archive.namelist():
-            if not language.matches_extension(path):
+        for info in archive.infolist():
+            if info.is_dir() or not language.matches_extension(info.filename):
                 continue
-            with archive.open(path, mode='r') as source_file:
-                yield clean_path(path), coerce_to_bytes(source_file.read())
+            with archive.open(info, mode='r') as source_file:
+                yield clean_path(info.filename), SourceFile.from_stream(source_file)
 
-    @staticmethod
-    def zip_url_for(repo: RepositoryMetadata) -> str:
-        return (f"https://api.github.com/repos/{repo.owner}/{repo.name}"
+    def zip_url_for(self, repo: RepositoryMetadata) -> str:
+        return (f"{self.api_url}/repos/{repo.owner}/{repo.name}"
                 f"/zipball/{repo.revision}")
 
 
@@ -160,60 +306,76 @@ class GitHubGraphQLClient:
     As of this writing, the endpoint is in alpha status, and has a restrictive
     rate limit.
     """
-    endpoint = "https://api.github.com/graphql"
-
-    def __init__(self) -> None:
-        self._requests_remaining = 11  # One more than min
-        # todo: datetime?
-        self._ratelimit_reset = 0.0
+    endpoint = f"{API_URL}/graphql"
+
+    def __init__(self, *, session: requests.Session = None, token: str = None,
+                 endpoint: str = None) -> None:
+        if endpoint is not None:
+            self.endpoint = endpoint
+        self.session = session if session is not None else create_session()
+        self.rate_limit = RateLimiter()
+        if token is None:
+            token = get_github_token()
         self._headers = {
-            'Authorization': f"bearer {get_github_token()}",
+            'Authorization': f"bearer {token}",
             'Accept': 'application/json',
-            'User-Agent': 'eddieantonio-sensibility/0.3.0'
         }
 
     def fetch_repository(self, repo: RepositoryID) -> RepositoryMetadata:
         """
         Return RepositoryMetadata for the given owner/name.
         """
-        json_data = self.query(r"""
-            query RepositoryInfo($owner: String!, $name: String!) {
-              repository(owner: $owner, name: $name) {
-                nameWithOwner
-                url
-                defaultBranchRef {
-                  name
-                  target {
-                    sha1: oid
-                    ... on Commit {
-                      committedDate
-                    }
-                  }
-                }
-                licenseInfo {
-                  name
-                }
-              }
-            }
-        """, owner=repo.owner, name=repo.name)
-
-        info = json_data['repository']
-        if info is None:
+        metadata, = self.fetch_repositories([repo])
+        if metadata is None:
             raise ValueError(f'Could not fetch info for {repo}')
-        owner, name = RepositoryID.parse(info['nameWithOwner'])
-        latest_commit = info['defaultBranchRef']['target']
-        license_name: Optional[str] = None
-        if info['licenseInfo'] is not None:
-            # as per https://developer.github.com/v4/object/license/
-            license_name = info['licenseInfo']['name']
-
-        return RepositoryMetadata(
-            owner=owner,
-            name=name,
-            revision=latest_commit['sha1'],
-            license=license_name or '',
-            commit_date=dateutil.parser.parse(latest_commit['committedDate'])
-        )
+        return metadata
+
+    def fetch_repositories(self, repos: Sequence[RepositoryID]) -> List[Optional[RepositoryMetadata]]:
+        """
+        Return RepositoryMetadata for each given owner/name, in one query;
+        None for the repositories that could not be fetched.
+        """
+        parameters = ', '.join(f'$owner{n}: String!, $name{n}: String!'
+                               for n in range(len(repos)))
+        fields = '\n'.join(f'r{n}: repository(owner: $owner{n}, name: $name{n})'
+                           ' { ...RepositoryInfo }'
+                           for n in range(len(repos)))
+        variables: Dict[str, Union[str, float, bool]] = {}
+        for n, repo in enumerate(repos):
+            variables[f'owner{n}'] = repo.owner
+            variables[f'name{n}'] = repo.name
+
+        json_data = self.query(f"""
+            query Repositories({parameters}) {{
+              {fields}
+            }}
+            fragment RepositoryInfo on Repository {{
+              nameWithOwner
+              url
+              defaultBranchRef {{
+                name
+                target {{
+                  sha1: oid
+                  ... on Commit {{
+                    committedDate
+                  }}
+                }}
+              }}
+              licenseInfo {{
+                name
+              }}
+            }}
+        """, **variables)
+
+        results: List[Optional[RepositoryMetadata]] = []
+        for n, repo in enumerate(repos):
+            try:
+                results.append(parse_repository(json_data.get(f'r{n}')))
+            except Exception:
+                # e.g., an empty repository has no default branch.
+                logger.exception('Could not parse info for %s', repo)
+                results.append(None)
+        return results
 
     def query(self, query: str, **variables: Union[str, float, bool]) -> Dict[str, Any]:
         """
@@ -222,13 +384,13 @@ class GitHubGraphQLClient:
 
         logger.debug("Performing query with vars: %r", variables)
 
-        self.wait_for_rate_limit()
-        resp = requests.post(self.endpoint, headers=self._headers, json={
+        self.rate_limit.acquire()
+        resp = self.session.post(self.endpoint, headers=self._headers, json={
             "query": query,
             "variables": variables
         })
+        self.rate_limit.update(resp.headers)
         resp.raise_for_status()
-        self.update_rate_limit(resp)
 
         response = resp.json()
         # Check that there are no errors.
@@ -237,31 +399,58 @@ class GitHubGraphQLClient:
 
         return response['data']
 
-    def update_rate_limit(self, resp: requests.Response) -> None:
-        self._requests_remaining = int(resp.headers['X-RateLimit-Remaining'])
-        self._ratelimit_reset = float(resp.headers['X-RateLimit-Reset'])
-        logger.debug('Updated ratelimit: %d left; reset at %s (in %s seconds)',
-                     self._requests_remaining, self.ratelimit_reset,
-                     self.seconds_until_reset)
 
-    @property
-    def ratelimit_reset(self) -> datetime.datetime:
-        return datetime.datetime.fromtimestamp(self._ratelimit_reset)
+def parse_repository(info: Optional[Dict[str, Any]]) -> Optional[RepositoryMetadata]:
+    """
+    Converts a repository from a GraphQL response to RepositoryMetadata.
+    """
+    if info is None:
+        return None
+    owner, name = RepositoryID.parse(info['nameWithOwner'])
+    latest_commit = info['defaultBranchRef']['target']
+    license_name: Optional[str] = None
+    if info['licenseInfo'] is not None:
+        # as per https://developer.github.com/v4/object/license/
+        license_name = info['licenseInfo']['name']
+
+    return RepositoryMetadata(
+        owner=owner,
+        name=name,
+        revision=latest_commit['sha1'],
+        license=license_name or '',
+        commit_date=dateutil.parser.parse(latest_commit['committedDate'])
+    )
+
+
+def create_session(pool_size: int = 1) -> requests.Session:
+    """
+    Creates an HTTP session that keeps up to pool_size connections per host
+    alive, so that threads sharing it reuse connections.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'eddieantonio-sensibility/0.3.0'
+    return session
 
-    @property
-    def seconds_until_reset(self) -> float:
-        return seconds_until(self._ratelimit_reset)
 
-    def wait_for_rate_limit(self) -> None:
-        """
-        Blocks until the rate limit is ready.
-        """
-        if self._requests_remaining > 10:
-            return
-        seconds_remaining = seconds_until(self._ratelimit_reset) + 2
-        logger.info("Rate limit almost exceeded; waiting %d seconds",
-                    seconds_remaining)
-        time.sleep(seconds_remaining)
+def spool(resp: requests.Response, max_size: int = SPOOL_SIZE) -> IO[bytes]:
+    """
+    Copies the body of a streamed response to a temporary file, which stays
+    in memory until it grows larger than max_size. The file is rewound.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for chunk in resp.iter_content(DOWNLOAD_CHUNK_SIZE):
+            spooled.write(chunk)
+    except Exception:
+        spooled.close()
+        raise
+    finally:
+        resp.close()
+    spooled.seek(0)
+    return spooled  # type: ignore
 
 
 def clean_path(path: str) -> PurePosixPath:
@@ -271,10 +460,3 @@ def clean_path(path: str) -> PurePosixPath:
     PurePosixPath('bop/__init__.py')
     """
     return PurePosixPath(*PurePosixPath(path).parts[1:])
-
-
-def coerce_to_bytes(thing: Union[str, bytes]) -> bytes:
-    """
-    Ensure whatever is passed in is a bytes object.
-    """
-    return thing.encode('UTF-8') if isinstance(thing, str) else thing
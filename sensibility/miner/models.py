@@ -28,7 +28,7 @@ import datetime
 import hashlib
 import re
 from pathlib import PurePosixPath
-from typing import NamedTuple, Union
+from typing import IO, NamedTuple, Optional, Union
 
 __all__ = [
     'RepositoryID'
@@ -72,21 +72,57 @@ class RepositoryMetadata(NamedTuple):
     commit_date: datetime.datetime
 
 
+# How many bytes to hash at once, when hashing a stream.
+HASH_CHUNK_SIZE = 64 * 1024
+
+
 class SourceFile:
-    def __init__(self, source: bytes) -> None:
+    """
+    The contents of a source file, identified by its SHA-256 hash.
+
+    The hash is computed at most once; pass filehash if it is already known
+    (e.g., it was stored in the corpus).
+
+    >>> SourceFile(b'').filehash
+    'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+    """
+    __slots__ = 'source', '_filehash'
+
+    def __init__(self, source: bytes, filehash: str = None) -> None:
         self.source = source
+        self._filehash: Optional[str] = filehash
 
     @property
-    def filehash(self):
+    def filehash(self) -> str:
+        if self._filehash is None:
+            self._filehash = hashlib.sha256(self.source).hexdigest()
+        return self._filehash
+
+    @classmethod
+    def from_stream(cls, stream: IO[bytes],
+                    chunk_size: int = HASH_CHUNK_SIZE) -> 'SourceFile':
+        """
+        Reads a source file from a binary stream (e.g., an entry of a zip
+        file), hashing it as it is read.
+
+        >>> import io
+        >>> SourceFile.from_stream(io.BytesIO(b''), chunk_size=2).filehash
+        'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+        """
         m = hashlib.sha256()
-        m.update(self.source)
-        return m.hexdigest()
+        chunks = []
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            m.update(chunk)
+            chunks.append(chunk)
+        return cls(b''.join(chunks), m.hexdigest())
 
     def __repr__(self) -> str:
         return f"SourceFile({self.filehash!r}, source=...)"
 
 
 class MockSourceFile(SourceFile):
+    __slots__ = ()
+
     def __init__(self, filehash: str) -> None:
         self._filehash = filehash
 
@@ -94,10 +130,6 @@ class MockSourceFile(SourceFile):
     def source(self):
         raise AttributeError('Does not contain source code')
 
-    @property
-    def filehash(self) -> str:
-        return self._filehash
-
 
 class _SourceFileInRepository(NamedTuple):
     repository: RepositoryMetadata
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Processes the files of the corpus in a pool of worker processes.
+
+Each worker sets the language, opens its own connection to the corpus, and
+keeps both for its whole life, so language backends (e.g., the Java parser)
+are started only once per worker. The caller feeds file hashes and consumes
+the results; writing the results is left to the caller, in one process.
+"""
+
+import logging
+import multiprocessing
+from collections import Counter
+from typing import (Any, Callable, Iterable, Iterator, List, Optional, Tuple,
+                    TypeVar)
+
+from more_itertools import chunked
+
+from sensibility.language import SourceSummary, language
+from sensibility.source_vector import SourceVector
+
+from .corpus import Corpus
+
+T = TypeVar('T')
+Task = Callable[[str, bytes], Any]
+
+# How many files to send to a worker at once.
+CHUNKSIZE = 64
+
+logger = logging.getLogger(__name__)
+
+# The task and corpus of the current worker process.
+_worker_task: Optional[Task] = None
+_worker_corpus: Optional[Corpus] = None
+
+
+def _initialize_worker(task: Task, language_name: str, url: str) -> None:
+    global _worker_task, _worker_corpus
+    language.set(language_name)
+    _worker_task = task
+    _worker_corpus = Corpus(url=url)
+
+
+def _apply(filehashes: List[str]) -> List[Tuple[str, Any]]:
+    assert _worker_task is not None and _worker_corpus is not None
+    return [(filehash, _worker_task(filehash, source))
+            for filehash, source in _worker_corpus.stream_sources(filehashes)]
+
+
+def map_sources(task: Callable[[str, bytes], T], filehashes: Iterable[str], *,
+                workers: int, corpus: Corpus=None) -> Iterator[Tuple[str, T]]:
+    """
+    Applies task(filehash, source) to every file of the corpus (by default,
+    the corpus of the current language), yielding (filehash, result) pairs in
+    no particular order. Unknown filehashes are skipped (see
+    Corpus.stream_sources()). The task must be a module-level function.
+
+    With zero workers, everything is done in this process.
+    """
+    if corpus is None:
+        corpus = Corpus()
+    if workers == 0:
+        for filehash, source in corpus.stream_sources(filehashes):
+            yield filehash, task(filehash, source)
+        return
+
+    # The pool consumes its input in another thread, but SQLite connections
+    # (e.g., Corpus.eligible_hashes) may only be used in their own thread.
+    chunks = list(chunked(filehashes, CHUNKSIZE))
+    with multiprocessing.Pool(workers, initializer=_initialize_worker,
+                              initargs=(task, language.id,
+                                        str(corpus.engine.url))) as pool:
+        for results in pool.imap_unordered(_apply, chunks):
+            yield from results
+
+
+def summarize_source(filehash: str, source: bytes) -> Optional[SourceSummary]:
+    """
+    Checks and summarizes one source file. Returns None when the file cannot
+    be parsed.
+    """
+    try:
+        return language.check_and_summarize(source)
+    except Exception:
+        logger.exception('Failed parsing %s', filehash)
+        return None
+
+
+def vectorize_source(filehash: str, source: bytes) -> SourceVector:
+    """
+    Converts one source file to a vector of vocabulary indices.
+    """
+    to_index = language.vocabulary.to_index
+    return SourceVector(to_index(entry)
+                        for entry in language.vocabularize(source))
+
+
+def count_entries(filehash: str, source: bytes) -> Counter:
+    """
+    Counts how many times each vocabulary entry occurs in one source file.
+    """
+    try:
+        return Counter(language.vocabularize(source))
+    except NotImplementedError:
+        # An unknown vocabulary entry; say where it happened.
+        logger.exception('Unknown vocabulary entry in %s', filehash)
+        raise
@@ -18,7 +18,9 @@
 
 import datetime
 import logging
+import threading
 import time
+from typing import Callable, Mapping, Optional
 
 from .connection import get_github_client
 
@@ -51,3 +53,70 @@ def seconds_until(timestamp: float) -> float:
     future = datetime.datetime.fromtimestamp(timestamp)
     difference = future - now
     return difference.seconds
+
+
+class RateLimiter:
+    """
+    A token bucket for one of GitHub's rate limits, shared between threads.
+
+    The bucket holds the requests remaining, as reported by the
+    X-RateLimit-* headers of the latest response, less the requests started
+    since. acquire() takes one; once only `reserve` are left, it blocks until
+    the limit resets. Until the first response arrives, the number of
+    remaining requests is unknown, and requests are let through.
+
+    >>> limiter = RateLimiter(reserve=1, clock=lambda: 100.,
+    ...                       sleep=lambda s: print('Waiting', s))
+    >>> limiter.update({'X-RateLimit-Remaining': '2',
+    ...                 'X-RateLimit-Reset': '130'})
+    >>> limiter.acquire()
+    >>> limiter.acquire()
+    Waiting 32.0
+    """
+
+    def __init__(self, reserve: int = 10,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.reserve = reserve
+        self.remaining: Optional[int] = None
+        self.reset = 0.
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes one request from the bucket, waiting for the reset if needed.
+        """
+        with self._lock:
+            if self.remaining is not None and self.remaining <= self.reserve:
+                delay = self.reset - self._clock()
+                if delay > 0:
+                    # Wait two extra seconds just to ensure.
+                    logger.info('Rate limit almost exceeded; '
+                                'waiting %d seconds', delay + 2)
+                    self._sleep(delay + 2)
+                # The next response will tell how many requests are left.
+                self.remaining = None
+            if self.remaining is not None:
+                self.remaining -= 1
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """
+        Refills the bucket from the headers of a response, if it has any.
+        """
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset = float(headers['X-RateLimit-Reset'])
+        except KeyError:
+            return
+        with self._lock:
+            if reset < self.reset:
+                # A late response from the previous window.
+                return
+            if reset == self.reset and self.remaining is not None:
+                # Responses can arrive out of order; trust the lowest count.
+                remaining = min(remaining, self.remaining)
+            self.remaining, self.reset = remaining, reset
+            logger.debug('Updated rate limit: %d left; reset at %s',
+                         remaining, datetime.datetime.fromtimestamp(reset))
@@ -15,13 +15,79 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import uuid
-from typing import AnyStr, Iterable
+from typing import AnyStr, Iterable, List, Optional
 
 import redis
+from more_itertools import chunked  # type: ignore
 
 from .names import WORK_QUEUE
 
+# How many elements to push per command, when enqueuing many.
+CHUNK_SIZE = 1024
+
+# How many seconds a worker's claim lasts without a heartbeat.
+LEASE = 300.
+
+# Claims up to ARGV[1] jobs, at time ARGV[2]: first, the jobs in the
+# worker's list (KEYS[2]), then from the queue (KEYS[1]). The claimed jobs are
+# added to the worker's in-flight jobs (KEYS[3]), scored by claim time, and
+# the worker (ARGV[3]) to the queue's workers (KEYS[4]).
+CLAIM_SCRIPT = """
+redis.call('ZADD', KEYS[4], ARGV[2], ARGV[3])
+local claimed = {}
+local job = redis.call('RPOP', KEYS[2])
+while job do
+    claimed[#claimed + 1] = job
+    job = redis.call('RPOP', KEYS[2])
+end
+while #claimed < tonumber(ARGV[1]) do
+    job = redis.call('RPOP', KEYS[1])
+    if not job then
+        break
+    end
+    claimed[#claimed + 1] = job
+end
+for _, claimed_job in ipairs(claimed) do
+    redis.call('ZADD', KEYS[3], ARGV[2], claimed_job)
+end
+return claimed
+"""
+
+# Renews, at time ARGV[1], the lease of the worker (ARGV[2]) in the queue's
+# workers (KEYS[1]), and the leases of its in-flight jobs (KEYS[2]).
+HEARTBEAT_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+for _, job in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    redis.call('ZADD', KEYS[2], ARGV[1], job)
+end
+"""
+
+# Returns the jobs whose leases ended before ARGV[1] to the queue (KEYS[1]),
+# to be retried next. When the lease of the worker (ARGV[2]) in the queue's
+# workers (KEYS[4]) has ended, all of its jobs are returned, from its
+# in-flight jobs (KEYS[3]) and its list (KEYS[2]), and it is forgotten.
+REAP_SCRIPT = """
+local heartbeat = redis.call('ZSCORE', KEYS[4], ARGV[2])
+local alive = heartbeat and tonumber(heartbeat) >= tonumber(ARGV[1])
+local max_score = alive and '(' .. ARGV[1] or '+inf'
+local jobs = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', max_score)
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', max_score)
+if not alive then
+    local job = redis.call('RPOP', KEYS[2])
+    while job do
+        jobs[#jobs + 1] = job
+        job = redis.call('RPOP', KEYS[2])
+    end
+    redis.call('ZREM', KEYS[4], ARGV[2])
+end
+for i = #jobs, 1, -1 do
+    redis.call('RPUSH', KEYS[1], jobs[i])
+end
+return #jobs
+"""
+
 
 class Queue(Iterable[bytes]):
     def __init__(self, name: str, client: redis.StrictRedis=None) -> None:
@@ -34,6 +100,13 @@ class Queue(Iterable[bytes]):
     def enqueue(self, thing: AnyStr) -> None:
         self.client.lpush(self.name, thing)
 
+    def enqueue_many(self, things: Iterable[AnyStr]) -> None:
+        """Enqueue many things, in order, in one round trip"""
+        pipeline = self.client.pipeline(transaction=False)
+        for chunk in chunked(things, CHUNK_SIZE):
+            pipeline.lpush(self.name, *chunk)
+        pipeline.execute()
+
     def pop(self) -> None:
         return self.client.rpop(self.name)
 
@@ -58,19 +131,92 @@ class Queue(Iterable[bytes]):
         """Transfer one element to the other"""
         return self.client.brpoplpush(self.name, other.name, timeout)
 
+    @property
+    def workers(self) -> str:
+        """The sorted set of workers of this queue, scored by heartbeat."""
+        return f"{self.name}:workers"
+
+    def reap(self, lease: float=LEASE, now: float=None) -> int:
+        """
+        Requeues the jobs whose leases have ended, and forgets the workers
+        whose leases have ended. Returns how many jobs were requeued.
+        """
+        if now is None:
+            now = time.time()
+        script = self.client.register_script(REAP_SCRIPT)
+        requeued = 0
+        for name in self.client.zrange(self.workers, 0, -1):
+            worker = name.decode('UTF-8')
+            requeued += script(keys=[self.name, worker, f"{worker}:in-flight",
+                                     self.workers],
+                               args=[now - lease, worker])
+        return requeued
+
 
 class WorkQueue:
+    """
+    Claims jobs from a queue, and remembers them until they are
+    acknowledged.
+
+    Claimed jobs are kept in a sorted set (self.in_flight), scored by when
+    they were claimed, so acknowledging a job takes O(log n) time.
+
+    Claims are leases: unless the worker calls heartbeat() to renew them, a
+    Queue.reap() after they end returns the jobs to the queue. The worker is
+    registered in the queue's workers for this purpose.
+    """
     def __init__(self, queue: Queue) -> None:
         self.origin = queue
         self._id = uuid.uuid4()
-        self._processing = Queue(self.name, client=queue.client)
+        # Waiting for a job moves it here, so it is never lost.
+        self._waiting = Queue(self.name, client=queue.client)
+        self._claim = queue.client.register_script(CLAIM_SCRIPT)
+        self._heartbeat = queue.client.register_script(HEARTBEAT_SCRIPT)
+        self.heartbeat()
 
     @property
     def name(self) -> str:
         return WORK_QUEUE[self._id]
 
-    def get(self, timeout: int=0) -> bytes:
-        return self.origin.transfer(self._processing, timeout)
+    @property
+    def in_flight(self) -> str:
+        return f"{self.name}:in-flight"
+
+    def get(self, timeout: int=0) -> Optional[bytes]:
+        jobs = self.get_many(1, timeout)
+        return jobs[0] if jobs else None
+
+    def get_many(self, n: int, timeout: int=0) -> List[bytes]:
+        """
+        Claims up to n jobs at once, waiting until there is at least one.
+        Returns an empty list on timeout.
+        """
+        jobs = self.claim(n)
+        if jobs:
+            return jobs
+        if self.origin.transfer(self._waiting, timeout) is None:
+            return []
+        return self.claim(n)
+
+    def claim(self, n: int) -> List[bytes]:
+        """
+        Claims up to n jobs at once, without waiting.
+        """
+        return self._claim(keys=[self.origin.name, self._waiting.name,
+                                 self.in_flight, self.origin.workers],
+                           args=[n, time.time(), self.name])
+
+    def heartbeat(self) -> None:
+        """
+        Renews the leases of this worker and of its in-flight jobs.
+        """
+        self._heartbeat(keys=[self.origin.workers, self.in_flight],
+                        args=[time.time(), self.name])
 
     def acknowledge(self, value: AnyStr) -> None:
-        self._processing.remove(value)
+        self.origin.client.zrem(self.in_flight, value)
+
+    def acknowledge_many(self, values: Iterable[AnyStr]) -> None:
+        values = list(values)
+        if values:
+            self.origin.client.zrem(self.in_flight, *values)
@@ -21,13 +21,16 @@ Miscellaneous filehashes
 
 import sqlite3
 import sys
-from typing import Iterator
+from typing import IO, Iterator
 
 
-def filehashes(file=sys.stdin) -> Iterator[str]:
+def filehashes(file: IO[str]=None) -> Iterator[str]:
     """
     Yields valid filehashes from stdin.
     """
+    # Look up stdin now, in case it was replaced (see `sensibility batch`).
+    if file is None:
+        file = sys.stdin
     # TODO: throw on invalid input or warn on invalid input
     # TODO: work on sys.argv
     for line in file:
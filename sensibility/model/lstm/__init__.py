@@ -67,8 +67,10 @@ class KerasDualLSTMModel(DualLSTMModel):
         self.backwards = backwards
         assert model_context_length(forwards) == model_context_length(backwards)
         self.context_length = model_context_length(forwards)
+        assert model_masks_padding(forwards) == model_masks_padding(backwards)
         self.one_hot = OneHotter(context_length=self.context_length,
-                                 vocabulary_size=len(language.vocabulary))
+                                 vocabulary_size=len(language.vocabulary),
+                                 mask_padding=model_masks_padding(forwards))
         self.logger.info('Loaded models with context length %d (window size %d)',
                          self.context_length, self.context_length + 1)
 
@@ -99,32 +101,44 @@ class KerasDualLSTMModel(DualLSTMModel):
 
     @staticmethod
     def from_filename(path: Path) -> 'Model':
+        """
+        Loads a model for prediction only: the model is built from its
+        config, and only its weights are read. Unlike load_model(), the
+        optimizer state is not restored and the model is not compiled.
+        """
         logger = logging.getLogger(__name__)
 
-        from keras.models import load_model
+        from keras.models import model_from_config
+        from .numpy_model import read_model_config
         logger.info('Loading model %s...', path)
-        model = load_model(os.fspath(path))
+        model = model_from_config(read_model_config(path))
+        model.load_weights(os.fspath(path))
         logger.info('Finished loading model %s:', path)
 
         return model
 
 
 class OneHotter:
-    def __init__(self, *, context_length: int, vocabulary_size: int) -> None:
+    def __init__(self, *, context_length: int, vocabulary_size: int,
+                 mask_padding: bool=False) -> None:
         self.context_length = context_length
         self.vocabulary_size = vocabulary_size
+        self.mask_padding = mask_padding
 
     def forwards(self, vector: Sequence[Vind]) -> np.ndarray:
-        return self._one_hot(vector, forward_sentences)
+        return self._one_hot(vector, forward_sentences,
+                             language.vocabulary.start_token_index)
 
     def backwards(self, vector: Sequence[Vind]) -> np.ndarray:
-        return self._one_hot(vector, backward_sentences)
+        return self._one_hot(vector, backward_sentences,
+                             language.vocabulary.end_token_index)
 
-    def _one_hot(self, vector: Sequence[Vind], sentenizer) -> np.ndarray:
+    def _one_hot(self, vector: Sequence[Vind], sentenizer,
+                 padding: Vind) -> np.ndarray:
         """
         Create a 3D matrix, the size of the vector on the largest axis.
         Each "slice" of the matrix is a sentence from the vector, one-hot
-        encoded.
+        encoded. When masking padding, the padding is left all-zero.
         """
         dim = (len(vector), self.context_length, self.vocabulary_size)
         xs: np.ndarray[bool] = np.zeros(dim, dtype=np.bool)
@@ -133,6 +147,8 @@ class OneHotter:
         # Fill in the matrix, sentence-by-sentence.
         for index, (sentence, _adjacent_token) in enumerate(sentences):
             for pos, vocab_id in enumerate(sentence):
+                if self.mask_padding and vocab_id == padding:
+                    continue
                 xs[index, pos, vocab_id] = True
 
         return xs
@@ -153,6 +169,13 @@ def model_context_length(model: 'Model') -> int:
         return length
 
 
+def model_masks_padding(model: 'Model') -> bool:
+    """
+    Whether the Keras model skips padding (see train-lstm --mask-padding).
+    """
+    return type(model.layers[0]).__name__ == 'Masking'
+
+
 def test(dirname: Path=None) -> None:
     from sensibility._paths import REPOSITORY_ROOT
     from sensibility.source_vector import to_source_vector
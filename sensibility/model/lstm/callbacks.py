@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Keras callbacks that let training resume exactly where it stopped.
+
+Importing this module imports Keras.
+"""
+
+from pathlib import Path
+from typing import Any, Dict
+
+from keras.callbacks import Callback, EarlyStopping
+
+from .train import ModelDescription, Position, ResumePoint, epoch_from_path
+
+
+class ResumableEarlyStopping(EarlyStopping):
+    """
+    EarlyStopping that continues counting from the given state (see
+    `state`), instead of starting over on every call to fit_generator().
+    """
+
+    def __init__(self, state: Dict[str, Any] = None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.resume_state = state
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """
+        The epochs waited since the best result, and the best result.
+        """
+        return dict(wait=self.wait, best=float(self.best))
+
+    def on_train_begin(self, logs: Dict[str, Any]=None) -> None:
+        super().on_train_begin(logs)
+        if self.resume_state is not None:
+            self.wait = self.resume_state['wait']
+            self.best = self.resume_state['best']
+
+    def on_epoch_end(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        super().on_epoch_end(epoch, logs)
+        self.resume_state = self.state
+
+
+class PipelinePosition(Callback):
+    """
+    Tracks the position (epoch, batch) of the next training batch, and saves
+    it with every checkpoint, along with the state of EarlyStopping.
+    """
+
+    def __init__(self, description: ModelDescription, position: Position,
+                 early_stopping: ResumableEarlyStopping) -> None:
+        super().__init__()
+        self.description = description
+        self.position = position
+        self.early_stopping = early_stopping
+        self.model: Any = None
+
+    def on_epoch_begin(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        # Only a resumed epoch starts midway.
+        if epoch != self.position[0]:
+            self.position = (epoch, 0)
+
+    def on_batch_end(self, batch: int, logs: Dict[str, Any]=None) -> None:
+        epoch, trained = self.position
+        self.position = (epoch, trained + 1)
+
+    def on_epoch_end(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        self.position = (epoch + 1, 0)
+        # ModelCheckpoint has just saved this epoch's model.
+        checkpoint = self.description.last_intermediate()
+        if checkpoint is not None and epoch_from_path(checkpoint) == epoch:
+            self.description.save_pipeline_state(
+                self.resume_point(checkpoint)
+            )
+
+    def resume_point(self, weights: Path) -> ResumePoint:
+        """
+        Where to continue from after the given weights. Callbacks before
+        this one (e.g., EarlyStopping) may have stopped the model.
+        """
+        stopped = bool(getattr(self.model, 'stop_training', False))
+        return ResumePoint(weights, self.position, stopped=stopped,
+                           early_stopping=self.early_stopping.resume_state)
@@ -20,24 +20,46 @@ Loops batches for training and for validation (development) forever.
 """
 
 import logging
+import multiprocessing
+import time
+from collections import deque
+from itertools import chain, count
 from pathlib import Path
-from random import shuffle
-from typing import Iterable, Iterator, Sequence, Set, Tuple, Union, cast
+from typing import (Any, Deque, Generator, Iterable, Iterator, List, Optional,
+                    Sequence, Set, Sized, Tuple, Union)
 
 import numpy as np
-from more_itertools import chunked
 
-from sensibility.evaluation.vectors import Vectors
+from sensibility.evaluation.packed_vectors import (PackedVectors,
+                                                   load_packed_vectors)
 from sensibility.language import language
-from sensibility.sentences import (Sentence, T, backward_sentences,
-                                   forward_sentences)
+
+from .shards import Shards
+from .throughput import PipelineStats
 
 Batch = Tuple[np.ndarray, np.ndarray]
+DualBatch = Tuple[List[np.ndarray], List[np.ndarray]]
 
 
 class LoopBatchesEndlessly(Iterable[Batch]):
     """
     Loops batches of vectors endlessly from the given filehashes.
+
+    vectors_path may either be a packed vector store (see
+    sensibility.evaluation.packed_vectors), which is memory-mapped, or, with
+    allow_sqlite, an SQLite3 vector database, which is read once, in its
+    entirety, when instantiated.
+    If shards_path names shards exported with the same files, context length
+    and direction (see sensibility.model.lstm.shards), samples are streamed
+    from the shards instead, and the vectors are never read.
+
+    With mask_padding, the <s> or </s> that pad contexts at the edges of files
+    are encoded as all-zero vectors, to be skipped by a Masking layer.
+
+    Every batch is a pure function of (seed, epoch, index) (see batch()), so
+    batches can be produced in any order, by any process. Iterating with
+    workers > 0 produces batches in that many processes in parallel, but
+    yields them in exactly the same order as producing them in-process.
     """
 
     def __init__(self, *,
@@ -45,62 +67,285 @@ class LoopBatchesEndlessly(Iterable[Batch]):
                  filehashes: Set[str],
                  batch_size: int,
                  context_length: int,
-                 backwards: bool) -> None:
+                 backwards: bool,
+                 seed: int=0,
+                 workers: int=0,
+                 shards_path: Path=None,
+                 mask_padding: bool=False,
+                 allow_sqlite: bool=False) -> None:
         assert vectors_path.exists()
         self.filename = vectors_path
-        self.filehashes = list(filehashes)
+        self.filehashes = filehashes
         self.batch_size = batch_size
         self.context_length = context_length
-        self.sentence_generator = (
-            backward_sentences if backwards else forward_sentences
-        )
+        self.backwards = backwards
+        self.seed = seed
+        self.workers = workers
+        self.mask_padding = mask_padding
+
+        self.shards: Optional[Shards] = None
+        self.index: Optional[SampleIndex] = None
+        if shards_path is not None and shards_path.exists():
+            self.shards = Shards(shards_path)
+            if not self.shards.matches(filehashes,
+                                       context_length=context_length,
+                                       backwards=backwards):
+                raise ValueError(f"Shards in {shards_path} were exported "
+                                 "for different samples")
+            self.samples_per_epoch = len(self.shards)
+        else:
+            # Sort the files, so that the order does not depend on set
+            # iteration.
+            self.index = SampleIndex(
+                load_packed_vectors(vectors_path, filehashes,
+                                    allow_sqlite=allow_sqlite),
+                sorted(filehashes)
+            )
+            # Samples are number of tokens in the filehash set.
+            self.samples_per_epoch = len(self.index)
+
+        self._order: Optional[Tuple[int, np.ndarray]] = None
+        # The time spent producing batches (see: throughput.ThroughputLogger)
+        self.stats = PipelineStats()
+
+    @property
+    def batches_per_epoch(self) -> int:
+        return -(-self.samples_per_epoch // self.batch_size)
+
+    def __iter__(self) -> Iterator[Batch]:
+        return self.iterate_from(0, 0)
 
-        # Samples are number of tokens in the filehash set.
-        self.samples_per_epoch = (
-            Vectors.from_filename(vectors_path)
-                   .length_of_vectors(filehashes)
+    def iterate_from(self, epoch: int,
+                     index: int) -> Generator[Batch, None, None]:
+        """
+        Yields every batch endlessly, starting at the given batch index of
+        the given epoch. Close the generator when done with it, to stop its
+        worker processes.
+        """
+        keys = chain(
+            ((epoch, i) for i in range(index, self.batches_per_epoch)),
+            ((e, i)
+             for e in count(epoch + 1)
+             for i in range(self.batches_per_epoch))
         )
+        if self.workers > 0:
+            yield from produce_in_parallel(self, keys, workers=self.workers)
+        else:
+            for key in keys:
+                yield self.batch(*key)
 
-    def __iter__(self) -> Iterator[Batch]:
+    def batch(self, epoch: int, index: int) -> Batch:
+        """
+        Returns the one-hot encoded batch at the given index of the given
+        epoch.
+        """
         logger = logging.getLogger(type(self).__name__)
-        batch_size = self.batch_size
-        for batch in self._yield_batches_endlessly():
-            logger.debug("Batch{%s}", LogBatch(batch))
-            yield one_hot_batch(batch,
-                                batch_size=batch_size,
-                                context_length=self.context_length)
+        start = time.perf_counter()
+        contexts, targets = self.samples(epoch, index)
+        read = time.perf_counter()
+        logger.debug("Batch{%s}", LogBatch(targets))
+        batch = one_hot_windows(contexts, targets,
+                                mask=self.padding(self.backwards))
+        self.stats.add(PipelineStats(1, len(targets),
+                                     io_time=read - start,
+                                     encode_time=time.perf_counter() - read))
+        return batch
+
+    def padding(self, backwards: bool) -> Optional[int]:
+        """
+        The padding token to mask in the given direction, if masking.
+        """
+        if not self.mask_padding:
+            return None
+        vocabulary = language.vocabulary
+        if backwards:
+            return vocabulary.end_token_index
+        return vocabulary.start_token_index
+
+    def samples(self, epoch: int, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the samples at the given batch index of the given epoch, in
+        vectorized format, but NOT one-hot encoded: a (batch, context) matrix
+        of contexts, and a vector of the cooresponding adjacent tokens.
+        """
+        assert 0 <= index < self.batches_per_epoch
+        start = index * self.batch_size
+        if self.shards is not None:
+            return self.shards.samples(self.seed, epoch,
+                                       start, start + self.batch_size)
+        assert self.index is not None
+        positions = self.index.positions(
+            self.order_for(epoch)[start:start + self.batch_size]
+        )
+        return self.index.windows(positions, self.context_length,
+                                  backwards=self.backwards)
+
+    def order_for(self, epoch: int) -> np.ndarray:
+        """
+        The sample numbers of the given epoch, shuffled across the entire
+        corpus (see SampleIndex.positions()).
+        """
+        assert self.index is not None
+        if self._order is None or self._order[0] != epoch:
+            rng = np.random.RandomState([self.seed, epoch])
+            # Same order as rng.permutation(), in the smallest dtype.
+            order = np.arange(len(self.index), dtype=self.index.dtype)
+            rng.shuffle(order)
+            self._order = epoch, order
+        return self._order[1]
+
 
-    def _yield_sentences_from_corpus(self) -> Iterable[Sentence]:
+class LoopDualBatchesEndlessly(LoopBatchesEndlessly):
+    """
+    Loops batches for training a forwards and a backwards model side by side.
+
+    Both directions' contexts are gathered from the same samples, so each
+    batch is ([forwards x, backwards x], [y, y]): the inputs and outputs of
+    the two models. Shards are direction-specific, so they are not used.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(backwards=False, shards_path=None, **kwargs)
+
+    def batch(self, epoch: int, index: int) -> DualBatch:  # type: ignore
         """
-        Yields all sentences from the corpus exactly once.
+        Returns the one-hot encoded forwards and backwards batches at the
+        given index of the given epoch.
         """
-        context_length = self.context_length
+        logger = logging.getLogger(type(self).__name__)
+        assert self.index is not None
+        assert 0 <= index < self.batches_per_epoch
+        start_time = time.perf_counter()
+        start = index * self.batch_size
+        positions = self.index.positions(
+            self.order_for(epoch)[start:start + self.batch_size]
+        )
+        forwards, targets = self.index.windows(positions, self.context_length,
+                                               backwards=False)
+        backwards, _ = self.index.windows(positions, self.context_length,
+                                          backwards=True)
+        read = time.perf_counter()
+        logger.debug("Batch{%s}", LogBatch(targets))
+        x_forwards, y = one_hot_windows(forwards, targets,
+                                        mask=self.padding(backwards=False))
+        x_backwards, _ = one_hot_windows(backwards, targets,
+                                         mask=self.padding(backwards=True))
+        self.stats.add(PipelineStats(1, len(targets),
+                                     io_time=read - start_time,
+                                     encode_time=time.perf_counter() - read))
+        return [x_forwards, x_backwards], [y, y]
+
+
+class SampleIndex(Sized):
+    """
+    Precomputed index of every sample in a set of packed vectors.
 
-        # Shuffle the files on each iteration.
-        shuffle(self.filehashes)
+    Samples are numbered in file order; a sample's position is that of its
+    adjacent token within the packed tokens, derived from the start of its
+    file, so the index takes memory per file, not per token. The contexts
+    surrounding samples are gathered, a batch at a time, with the file
+    boundaries padded with <s> or </s>.
+    """
 
-        vectors = Vectors.from_filename(self.filename)
-        for filehash in self.filehashes:
-            # Shuffle sentences randomly from each file.
-            # This minimizes class imbalance per batch in languages that might
-            # exhibit a large amount of repeating tokens like
-            #   <identifier> <identifier> = <identifier> . <identifier> ;
-            # *cough* java *cough*
-            tokens = cast(Sequence[int], vectors[filehash])
-            sentences = list(self.sentence_generator(tokens, context=context_length))
-            shuffle(sentences)
-            yield from sentences
-        vectors.disconnect()
+    def __init__(self, vectors: PackedVectors, filehashes: Sequence[str]) -> None:
+        self.tokens = vectors.tokens
+        extents = sorted(vectors.index[fh] for fh in filehashes
+                         if fh in vectors.index)
+        # Empty files have no samples, so they never delimit a sample.
+        extents = [(start, length) for start, length in extents if length > 0]
+        self.starts = np.array([start for start, _ in extents], dtype=np.int64)
+        lengths = np.array([length for _, length in extents], dtype=np.int64)
+        self.ends = self.starts + lengths
+
+        # The number of the first sample of each file.
+        self.offsets = np.cumsum(lengths) - lengths
+        self.n_samples = int(lengths.sum())
+        # The smallest dtype that can number every sample.
+        self.dtype = (np.int32 if self.n_samples <= np.iinfo(np.int32).max
+                      else np.int64)
+
+    def __len__(self) -> int:
+        return self.n_samples
+
+    def positions(self, samples: np.ndarray) -> np.ndarray:
+        """
+        The positions of the given sample numbers within the packed tokens.
+        """
+        samples = samples.astype(np.int64)
+        k = np.searchsorted(self.offsets, samples, side='right') - 1
+        return self.starts[k] + (samples - self.offsets[k])
 
-    def _yield_batches_endlessly(self):
+    def windows(self, positions: np.ndarray, context_length: int, *,
+                backwards: bool) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Yields batches of samples, in vectorized format, but NOT one-hot
-        encoded.
+        Gathers the contexts (prefixes, or if backwards, suffixes) of
+        context_length tokens, and the adjacent token of each of the given
+        positions.
         """
-        batch_size = self.batch_size
-        while True:
-            yield from chunked(self._yield_sentences_from_corpus(),
-                               batch_size)
+        vocabulary = language.vocabulary
+        # Determine the boundaries of the file of each sample.
+        k = np.searchsorted(self.starts, positions, side='right') - 1
+        if backwards:
+            offsets = np.arange(1, context_length + 1)
+            indices = positions[:, np.newaxis] + offsets
+            in_file = indices < self.ends[k][:, np.newaxis]
+            padding = vocabulary.end_token_index
+        else:
+            offsets = np.arange(-context_length, 0)
+            indices = positions[:, np.newaxis] + offsets
+            in_file = indices >= self.starts[k][:, np.newaxis]
+            padding = vocabulary.start_token_index
+        indices = np.clip(indices, 0, max(len(self.tokens) - 1, 0))
+        contexts = np.where(in_file, self.tokens[indices], padding)
+        return contexts.astype(np.uint8), self.tokens[positions]
+
+
+# The batches of the current worker process.
+_worker_batches: Optional[LoopBatchesEndlessly] = None
+
+
+def _initialize_worker(batches: LoopBatchesEndlessly) -> None:
+    global _worker_batches
+    _worker_batches = batches
+
+
+def _produce_batch(key: Tuple[int, int]) -> Tuple[Batch, PipelineStats]:
+    assert _worker_batches is not None
+    # Send back the time spent on this batch alone.
+    _worker_batches.stats = PipelineStats()
+    return _worker_batches.batch(*key), _worker_batches.stats
+
+
+def produce_in_parallel(batches: LoopBatchesEndlessly,
+                        keys: Iterable[Tuple[int, int]], *,
+                        workers: int,
+                        prefetch: int=None) -> Generator[Batch, None, None]:
+    """
+    Produces the batches for the given (epoch, index) keys in a pool of
+    worker processes, yielding them in order. At most `prefetch` batches are
+    produced ahead of the consumer. The pool is terminated when the
+    generator is exhausted or closed.
+    """
+    if prefetch is None:
+        prefetch = 2 * workers
+    pool = multiprocessing.Pool(workers, initializer=_initialize_worker,
+                                initargs=(batches,))
+    pending: Deque[Any] = deque()
+
+    def next_batch() -> Batch:
+        batch, stats = pending.popleft().get()
+        batches.stats.add(stats)
+        return batch
+
+    try:
+        for key in keys:
+            pending.append(pool.apply_async(_produce_batch, (key,)))
+            if len(pending) >= prefetch:
+                yield next_batch()
+        while pending:
+            yield next_batch()
+    finally:
+        pool.terminate()
 
 
 def one_hot_batch(batch, *,
@@ -108,7 +353,8 @@ def one_hot_batch(batch, *,
                   context_length: int,
                   vocabulary_size: int=None) -> Batch:
     """
-    Creates one hot vectors (x, y arrays) of the batch.
+    Creates one hot vectors (x, y arrays) of the batch. A partial batch
+    is allocated at its exact size.
 
     >>> x, y = one_hot_batch([(np.array([36]), 48)],
     ...                      batch_size=1024,
@@ -116,34 +362,64 @@ def one_hot_batch(batch, *,
     ...                      vocabulary_size=100)
     >>> x.shape
     (1, 20, 100)
-    >>> x[0, 0, 36]
-    1
+    >>> bool(x[0, 0, 36])
+    True
     >>> y.shape
     (1, 100)
-    >>> y[0, 48]
-    1
+    >>> bool(y[0, 48])
+    True
     """
     if vocabulary_size is None:
         vocabulary_size = len(language.vocabulary)
+    samples = list(batch)
+    assert len(samples) <= batch_size
     # Create empty one-hot vectors
-    x: np.ndarray[bool] = np.zeros((batch_size, context_length, vocabulary_size), dtype=np.bool)
-    y: np.ndarray[bool] = np.zeros((batch_size, vocabulary_size), dtype=np.bool)
+    x = np.zeros((len(samples), context_length, vocabulary_size), dtype=np.bool)
+    y = np.zeros((len(samples), vocabulary_size), dtype=np.bool)
 
     # Fill in the vectors.
-    for sentence_id, (sentence, last_token_id) in enumerate(batch):
+    for sentence_id, (sentence, last_token_id) in enumerate(samples):
         # Fill in the one-hot matrix for X
-        for pos, token_id in enumerate(sentence):
-            x[sentence_id, pos, token_id] = True
-
+        x[sentence_id, np.arange(len(sentence)), sentence] = True
         # Add the last token for the one-hot vector Y.
         y[sentence_id, last_token_id] = True
 
-    samples_produced = sentence_id + 1
+    return x, y
 
-    if samples_produced < batch_size:
-        x = np.resize(x, ((samples_produced, context_length, vocabulary_size)))
-        y = np.resize(y, ((samples_produced, vocabulary_size)))
 
+def one_hot_windows(contexts: np.ndarray, targets: np.ndarray,
+                    vocabulary_size: int=None, *,
+                    mask: int=None) -> Batch:
+    """
+    Creates one hot vectors (x, y arrays) of a matrix of contexts and a
+    vector of targets. Context tokens equal to mask (if given) are left
+    all-zero, so that a Masking layer skips them.
+
+    >>> x, y = one_hot_windows(np.array([[36, 1]]), np.array([48]),
+    ...                        vocabulary_size=100)
+    >>> x.shape, y.shape
+    ((1, 2, 100), (1, 100))
+    >>> bool(x[0, 0, 36]), bool(x[0, 1, 1]), bool(y[0, 48])
+    (True, True, True)
+    >>> int(x.sum()), int(y.sum())
+    (2, 1)
+    >>> x, _ = one_hot_windows(np.array([[0, 0, 36]]), np.array([48]),
+    ...                        vocabulary_size=100, mask=0)
+    >>> x.sum(axis=-1).tolist()
+    [[0, 0, 1]]
+    """
+    if vocabulary_size is None:
+        vocabulary_size = len(language.vocabulary)
+    n_samples, context_length = contexts.shape
+    x = np.zeros((n_samples, context_length, vocabulary_size), dtype=np.bool)
+    y = np.zeros((n_samples, vocabulary_size), dtype=np.bool)
+    if mask is None:
+        sample_ids = np.arange(n_samples)
+        x[sample_ids[:, np.newaxis], np.arange(context_length), contexts] = True
+    else:
+        sample_ids, positions = np.nonzero(contexts != mask)
+        x[sample_ids, positions, contexts[sample_ids, positions]] = True
+    y[np.arange(n_samples), targets] = True
     return x, y
 
 
@@ -155,17 +431,17 @@ class LogBatch:
     A hacky class to log the targets per batch.  This is to debug class
     imbalance issues.
     """
-    __slots__ = 'batch',
+    __slots__ = 'targets',
 
-    def __init__(self, batch: Sequence[Sentence]) -> None:
-        self.batch = batch
+    def __init__(self, targets: np.ndarray) -> None:
+        self.targets = targets
 
     def __str__(self) -> str:
         from collections import Counter
-        counter = Counter(target for _context, target in self.batch)
+        counter = Counter(int(target) for target in self.targets)
 
         def generate_parts():
-            total = len(self.batch)
+            total = len(self.targets)
             accounted_for = 0
             for target, count in counter.most_common(5):
                 token = language.vocabulary.to_text(target)
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Predicts with trained LSTM models in pure NumPy, without importing Keras.
+
+Models are read either from the HDF5 files saved by Keras (using h5py), or
+from an exported model.
+
+Exported models (see bin/export-model) are stored in one compressed .npz
+file, holding the weights of both directions, optionally as float16, or as
+int8 with one scale per output unit.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import (TYPE_CHECKING, Any, Dict, Iterable, Iterator, List,
+                    Optional, Sequence, Tuple, Union)
+
+import numpy as np
+
+from sensibility.evaluation.packed_vectors import PackedVectors
+from sensibility.language import language
+from sensibility.vocabulary import Vind
+
+from . import DualLSTMModel, TokenResult
+from .loop_batches import SampleIndex
+
+if TYPE_CHECKING:
+    from keras.models import Model
+
+DTYPES = ('float32', 'float16', 'int8')
+
+# Arrays of weights, by name.
+Weights = Dict[str, np.ndarray]
+# A Keras layer's class name, config, and weights.
+Layer = Tuple[str, Dict[str, Any], List[np.ndarray]]
+
+
+class LSTM:
+    """
+    An LSTM layer, computed like Keras 2's default LSTM: gates in the order
+    input, forget, cell, output; tanh activation; and hard sigmoid recurrent
+    activation.
+    """
+
+    def __init__(self, kernel: np.ndarray, recurrent_kernel: np.ndarray,
+                 bias: np.ndarray, *, return_sequences: bool) -> None:
+        self.kernel = kernel
+        self.recurrent_kernel = recurrent_kernel
+        self.bias = bias
+        self.return_sequences = return_sequences
+
+    @property
+    def units(self) -> int:
+        return self.recurrent_kernel.shape[0]
+
+    def project_tokens(self, tokens: np.ndarray) -> np.ndarray:
+        """
+        Projects one-hot inputs, given as their vocabulary indices. The
+        product of a one-hot vector and the kernel is just a row of the
+        kernel.
+        """
+        return self.kernel[tokens] + self.bias
+
+    def project(self, inputs: np.ndarray) -> np.ndarray:
+        return inputs @ self.kernel + self.bias
+
+    def recur(self, projected: np.ndarray,
+              mask: Optional[np.ndarray]=None) -> np.ndarray:
+        """
+        Runs the recurrence over projected inputs (samples × time × 4 units).
+        Masked time steps are skipped: they carry the previous state over.
+        Without a mask, every time step is used.
+        """
+        outputs = self.sequence(projected, mask)
+        if self.return_sequences:
+            return outputs
+        return outputs[:, -1]
+
+    def sequence(self, projected: np.ndarray,
+                 mask: Optional[np.ndarray]=None) -> np.ndarray:
+        """
+        Like recur(), but always returns the output of every time step.
+        """
+        n_samples, n_steps, _ = projected.shape
+        units = self.units
+        h = np.zeros((n_samples, units), dtype=projected.dtype)
+        c = np.zeros((n_samples, units), dtype=projected.dtype)
+        outputs: List[np.ndarray] = []
+        for t in range(n_steps):
+            z = projected[:, t] + h @ self.recurrent_kernel
+            i = hard_sigmoid(z[:, :units])
+            f = hard_sigmoid(z[:, units:2 * units])
+            g = np.tanh(z[:, 2 * units:3 * units])
+            o = hard_sigmoid(z[:, 3 * units:])
+            next_c = f * c + i * g
+            next_h = o * np.tanh(next_c)
+            if mask is None:
+                h, c = next_h, next_c
+            else:
+                keep = mask[:, t, np.newaxis]
+                h = np.where(keep, next_h, h)
+                c = np.where(keep, next_c, c)
+            outputs.append(h)
+        return np.stack(outputs, axis=1)
+
+
+class NumpyLSTMModel:
+    """
+    One direction of a dual model: LSTM layers, then a dense layer with a
+    softmax activation (the "head").
+    """
+
+    def __init__(self, layers: Sequence[LSTM], dense_kernel: np.ndarray,
+                 dense_bias: np.ndarray, *, context_length: int,
+                 masks_padding: bool) -> None:
+        assert len(layers) >= 1
+        self.layers = layers
+        self.dense_kernel = dense_kernel
+        self.dense_bias = dense_bias
+        self.context_length = context_length
+        self.masks_padding = masks_padding
+
+    def predict(self, contexts: np.ndarray, padding: int) -> np.ndarray:
+        """
+        Predicts the adjacent token of each context in a batch, given as a
+        (samples × context) matrix of vocabulary indices.
+        """
+        mask: Optional[np.ndarray] = None
+        if self.masks_padding:
+            mask = contexts != padding
+        first, *rest = self.layers
+        outputs = first.recur(first.project_tokens(contexts), mask)
+        for layer in rest:
+            outputs = layer.recur(layer.project(outputs), mask)
+        return softmax(outputs @ self.dense_kernel + self.dense_bias)
+
+    def predict_stream(self, tokens: np.ndarray, padding: int) -> np.ndarray:
+        """
+        Predicts every token of a file, given as a vector of vocabulary
+        indices, in one pass over the file: the state of the LSTM is
+        carried along the file instead of restarting at every window.
+
+        The prediction of each token is conditioned on every token before
+        it, rather than on the last context_length tokens only. Only
+        prefixes (forwards models) can be streamed: a suffix is read away
+        from the token it predicts.
+        """
+        # Like the first window, start after context_length padding tokens.
+        start = self.context_length - 1
+        inputs = np.concatenate([
+            np.full(self.context_length, padding, dtype=np.int64),
+            np.asarray(tokens, dtype=np.int64)[:-1]
+        ])[np.newaxis]
+        mask: Optional[np.ndarray] = None
+        if self.masks_padding:
+            mask = inputs != padding
+        first, *rest = self.layers
+        outputs = first.sequence(first.project_tokens(inputs), mask)
+        for layer in rest:
+            outputs = layer.sequence(layer.project(outputs), mask)
+        # The state after the padding predicts the first token.
+        outputs = outputs[0, start:start + len(tokens)]
+        return softmax(outputs @ self.dense_kernel + self.dense_bias)
+
+    def weights(self) -> Weights:
+        """
+        The weights of this model, by name.
+        """
+        weights = {'dense.kernel': self.dense_kernel,
+                   'dense.bias': self.dense_bias}
+        for n, layer in enumerate(self.layers):
+            weights[f'lstm{n}.kernel'] = layer.kernel
+            weights[f'lstm{n}.recurrent_kernel'] = layer.recurrent_kernel
+            weights[f'lstm{n}.bias'] = layer.bias
+        return weights
+
+    def config(self) -> Dict[str, Any]:
+        return dict(context_length=self.context_length,
+                    masks_padding=self.masks_padding,
+                    layers=len(self.layers))
+
+    @classmethod
+    def from_weights(cls, config: Dict[str, Any],
+                     weights: Weights) -> 'NumpyLSTMModel':
+        n_layers = config['layers']
+        layers = [LSTM(weights[f'lstm{n}.kernel'],
+                       weights[f'lstm{n}.recurrent_kernel'],
+                       weights[f'lstm{n}.bias'],
+                       return_sequences=n < n_layers - 1)
+                  for n in range(n_layers)]
+        return cls(layers, weights['dense.kernel'], weights['dense.bias'],
+                   context_length=config['context_length'],
+                   masks_padding=config['masks_padding'])
+
+    @classmethod
+    def from_keras(cls, model: 'Model') -> 'NumpyLSTMModel':
+        """
+        Copies the weights of a Keras model, as trained by train-lstm.
+        """
+        return cls.from_layers((type(layer).__name__, layer.get_config(),
+                                layer.get_weights())
+                               for layer in model.layers)
+
+    @classmethod
+    def from_hdf5(cls, path: Union[Path, str]) -> 'NumpyLSTMModel':
+        """
+        Reads a Keras model saved in HDF5 (either by model.save() or
+        ModelCheckpoint), without Keras.
+        """
+        import h5py  # type: ignore
+        with h5py.File(os.fspath(path), 'r') as model_file:
+            config = json.loads(as_str(model_file.attrs['model_config']))
+            weights = model_file['model_weights']
+            return cls.from_layers(
+                (layer['class_name'], layer['config'],
+                 layer_weights(weights[layer['config']['name']]))
+                for layer in sequential_layers(config)
+            )
+
+    @classmethod
+    def from_layers(cls, layers: Iterable[Layer]) -> 'NumpyLSTMModel':
+        """
+        Creates the model from the class name, config, and weights of each
+        Keras layer.
+        """
+        lstms: List[LSTM] = []
+        dense: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        context_length: Optional[int] = None
+        masks_padding = False
+        for kind, config, weights in layers:
+            if context_length is None:
+                # The first layer defines the input.
+                _, context_length, _vocab = config['batch_input_shape']
+                masks_padding = kind == 'Masking'
+            if kind == 'LSTM':
+                check_lstm_config(config)
+                kernel, recurrent_kernel, bias = weights
+                lstms.append(LSTM(
+                    kernel, recurrent_kernel, bias,
+                    return_sequences=config['return_sequences']
+                ))
+            elif kind == 'Dense':
+                kernel, bias = weights
+                dense = kernel, bias
+            elif kind == 'Activation':
+                if config['activation'] != 'softmax':
+                    raise ValueError(f"Unsupported activation: {config}")
+            elif kind not in ('Masking', 'Dropout'):
+                raise ValueError(f"Unsupported layer: {kind}")
+        if dense is None or context_length is None:
+            raise ValueError("Not a model trained by train-lstm")
+        return cls(lstms, *dense, context_length=context_length,
+                   masks_padding=masks_padding)
+
+
+class NumpyDualLSTMModel(DualLSTMModel):
+    """
+    Predicts with a forwards and a backwards model in NumPy. All windows of
+    a file are predicted at once, as one batch.
+
+    When streaming, the forwards model reads the file in one pass instead
+    (see NumpyLSTMModel.predict_stream()).
+    """
+
+    def __init__(self, *, forwards: NumpyLSTMModel,
+                 backwards: NumpyLSTMModel, stream: bool=False) -> None:
+        assert forwards.context_length == backwards.context_length
+        self.forwards = forwards
+        self.backwards = backwards
+        self.context_length = forwards.context_length
+        self.stream = stream
+
+    def predict_file(self, vector: Sequence[Vind]) -> Sequence[TokenResult]:
+        index = file_index(vector)
+        positions = np.arange(len(index))
+        vocabulary = language.vocabulary
+        if self.stream:
+            fw_predictions = self.forwards.predict_stream(
+                index.tokens, vocabulary.start_token_index
+            )
+        else:
+            fw_contexts, _ = index.windows(positions, self.context_length,
+                                           backwards=False)
+            fw_predictions = self.forwards.predict(
+                fw_contexts, vocabulary.start_token_index
+            )
+        bw_contexts, _ = index.windows(positions, self.context_length,
+                                       backwards=True)
+        bw_predictions = self.backwards.predict(bw_contexts,
+                                                vocabulary.end_token_index)
+        return tuple(TokenResult(fw, bw)
+                     for fw, bw in zip(fw_predictions, bw_predictions))
+
+    def save(self, path: Path, *, dtype: str='float32',
+             prune: float=0.) -> None:
+        """
+        Saves both models to one .npz file. Weights are (optionally) pruned,
+        then stored in the given dtype.
+        """
+        assert dtype in DTYPES
+        arrays: Dict[str, np.ndarray] = {}
+        for direction, model in self.directions():
+            for name, weights in model.weights().items():
+                key = f'{direction}.{name}'
+                # Biases are tiny; keep them exact.
+                if not name.endswith('.bias'):
+                    weights = prune_smallest(weights, prune)
+                    if dtype == 'int8':
+                        arrays[key], arrays[key + '.scale'] = quantize(weights)
+                        continue
+                    weights = weights.astype(dtype)
+                arrays[key] = weights
+        metadata = {direction: model.config()
+                    for direction, model in self.directions()}
+        arrays['metadata'] = np.array(json.dumps(metadata))
+        np.savez_compressed(os.fspath(path), **arrays)
+
+    @classmethod
+    def from_directory(cls, dirname: Union[Path, str]) -> 'NumpyDualLSTMModel':
+        """
+        Reads the two Keras models in the given directory.
+        """
+        return cls(
+            forwards=NumpyLSTMModel.from_hdf5(Path(dirname) / 'forwards.hdf5'),
+            backwards=NumpyLSTMModel.from_hdf5(Path(dirname) / 'backwards.hdf5')
+        )
+
+    def directions(self) -> Iterator[Tuple[str, NumpyLSTMModel]]:
+        yield 'forwards', self.forwards
+        yield 'backwards', self.backwards
+
+    @classmethod
+    def from_filename(cls, path: Union[Path, str]) -> 'NumpyDualLSTMModel':
+        """
+        Loads an exported model. Weights are computed with as float32.
+        """
+        with np.load(os.fspath(path)) as archive:
+            arrays = {key: archive[key] for key in archive.files}
+        metadata = json.loads(str(arrays.pop('metadata')))
+
+        def load(direction: str) -> NumpyLSTMModel:
+            prefix = direction + '.'
+            weights: Weights = {}
+            for key, array in arrays.items():
+                if not key.startswith(prefix) or key.endswith('.scale'):
+                    continue
+                scale = arrays.get(key + '.scale')
+                if scale is not None:
+                    array = array * scale
+                weights[key[len(prefix):]] = array.astype(np.float32)
+            return NumpyLSTMModel.from_weights(metadata[direction], weights)
+
+        return cls(forwards=load('forwards'), backwards=load('backwards'))
+
+
+def check_lstm_config(config: Dict[str, Any]) -> None:
+    """
+    Ensures the LSTM is computed like LSTM.recur().
+    """
+    if (config.get('activation') != 'tanh' or
+            config.get('recurrent_activation') != 'hard_sigmoid' or
+            not config.get('use_bias', True) or
+            config.get('go_backwards') or
+            config.get('stateful')):
+        raise ValueError(f"Unsupported LSTM configuration: {config}")
+
+
+def read_model_config(path: Union[Path, str]) -> Dict[str, Any]:
+    """
+    Reads the architecture of a model saved by Keras.
+    """
+    import h5py  # type: ignore
+    with h5py.File(os.fspath(path), 'r') as model_file:
+        return json.loads(as_str(model_file.attrs['model_config']))
+
+
+def sequential_layers(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Returns the configs of the layers of a Sequential model's config.
+    """
+    if config['class_name'] != 'Sequential':
+        raise ValueError(f"Not a Sequential model: {config['class_name']}")
+    layers = config['config']
+    # Newer versions of Keras wrap the list of layers.
+    if isinstance(layers, dict):
+        layers = layers['layers']
+    return layers
+
+
+def layer_weights(group: Any) -> List[np.ndarray]:
+    """
+    Reads the weights of one layer from an HDF5 group, in order.
+    """
+    return [np.array(group[as_str(name)])
+            for name in group.attrs['weight_names']]
+
+
+def as_str(value: Union[str, bytes]) -> str:
+    """
+    HDF5 attributes may be either bytes or strings.
+
+    >>> as_str(b'lstm_1/kernel:0'), as_str('dense_1')
+    ('lstm_1/kernel:0', 'dense_1')
+    """
+    if isinstance(value, bytes):
+        return value.decode('UTF-8')
+    return value
+
+
+def file_index(vector: Sequence[Vind]) -> SampleIndex:
+    """
+    Indexes every sample of a single file.
+    """
+    tokens = np.array(vector, dtype=np.uint8)
+    return SampleIndex(PackedVectors(tokens, {'file': (0, len(tokens))}),
+                       ['file'])
+
+
+def hard_sigmoid(x: np.ndarray) -> np.ndarray:
+    return np.clip(0.2 * x + 0.5, 0., 1.)
+
+
+def softmax(x: np.ndarray) -> np.ndarray:
+    """
+    >>> softmax(np.array([[0., 0.], [1., 1.]])).tolist()
+    [[0.5, 0.5], [0.5, 0.5]]
+    """
+    exp = np.exp(x - x.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def prune_smallest(weights: np.ndarray, fraction: float) -> np.ndarray:
+    """
+    Zeroes the given fraction of the weights with the smallest magnitudes.
+
+    >>> prune_smallest(np.array([0.1, -3., 0.5, -0.2]), 0.5).tolist()
+    [0.0, -3.0, 0.5, 0.0]
+    """
+    if fraction <= 0.:
+        return weights
+    # np.quantile() needs NumPy 1.15.
+    threshold = np.percentile(np.abs(weights), 100. * fraction)
+    pruned = np.where(np.abs(weights) <= threshold, 0., weights)
+    return pruned.astype(weights.dtype)
+
+
+def quantize(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes weights to int8, with one scale per output unit (column).
+
+    >>> q, scale = quantize(np.array([[1., -0.5], [-2., 0.25]]))
+    >>> q.tolist(), scale.tolist()
+    ([[64, -127], [-127, 64]], [0.015748031437397003, 0.003937007859349251])
+    """
+    scale = np.abs(weights).max(axis=0) / 127.
+    scale[scale == 0.] = 1.
+    quantized = np.round(weights / scale).astype(np.int8)
+    return quantized, scale.astype(np.float32)
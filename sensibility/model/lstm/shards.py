@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pre-built, shuffled shards of training samples.
+
+A shard directory holds every sample of a set of files for one context
+length and direction:
+
+    manifest.json       how the samples were made, and the size of each shard
+    shard-NNNNN.npz     compressed contexts (samples × context) and targets
+
+Windowing the files is done once, when the shards are exported; training
+only decompresses them.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import (TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sized,
+                    Tuple)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .loop_batches import LoopBatchesEndlessly
+
+MANIFEST_FILENAME = 'manifest.json'
+
+Samples = Tuple[np.ndarray, np.ndarray]
+
+
+class Shards(Sized):
+    """
+    Reads the samples of a shard directory.
+
+    Every epoch visits the shards in a different order, and the samples
+    within each shard in a different order, both determined by the seed.
+    """
+
+    # How many decompressed shards to keep in memory.
+    CACHE_SIZE = 2
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path / MANIFEST_FILENAME) as manifest_file:
+            self.manifest: Dict[str, Any] = json.load(manifest_file)
+        self.filenames: List[str] = self.manifest['shards']
+        self.sizes = np.array(self.manifest['sizes'], dtype=np.int64)
+        self._cache: 'OrderedDict[int, Samples]' = OrderedDict()
+        # The shard order of one epoch, and the shuffles of its shards.
+        self._epoch_order: Optional[Tuple[Tuple[int, int], np.ndarray]] = None
+        self._shuffles: 'OrderedDict[Tuple[int, int, int], np.ndarray]' = OrderedDict()
+
+    @property
+    def context_length(self) -> int:
+        return self.manifest['context_length']
+
+    @property
+    def backwards(self) -> bool:
+        return self.manifest['backwards']
+
+    def matches(self, filehashes: Iterable[str], *,
+                context_length: int, backwards: bool) -> bool:
+        """
+        Whether these shards were exported with the given parameters.
+        """
+        return (self.manifest['filehashes'] == digest(filehashes) and
+                self.context_length == context_length and
+                self.backwards == backwards)
+
+    def __len__(self) -> int:
+        return int(self.sizes.sum())
+
+    def samples(self, seed: int, epoch: int, start: int, stop: int) -> Samples:
+        """
+        Returns the samples in [start, stop) of the given epoch.
+        """
+        order = self.order(seed, epoch)
+        ends = np.cumsum(self.sizes[order])
+        starts = ends - self.sizes[order]
+        first = np.searchsorted(ends, start, side='right')
+        last = np.searchsorted(ends, stop - 1, side='right')
+
+        contexts: List[np.ndarray] = []
+        targets: List[np.ndarray] = []
+        for slot in range(first, min(last + 1, len(order))):
+            shard = int(order[slot])
+            shard_contexts, shard_targets = self.shard(shard)
+            shuffle = self.shuffle(seed, epoch, shard)
+            lower = max(start - starts[slot], 0)
+            upper = min(stop - starts[slot], len(shard_targets))
+            contexts.append(shard_contexts[shuffle[lower:upper]])
+            targets.append(shard_targets[shuffle[lower:upper]])
+        return np.concatenate(contexts), np.concatenate(targets)
+
+    def order(self, seed: int, epoch: int) -> np.ndarray:
+        """
+        The order in which the given epoch visits the shards.
+        """
+        if self._epoch_order is None or self._epoch_order[0] != (seed, epoch):
+            order = np.random.RandomState([seed, epoch]).permutation(len(self.sizes))
+            self._epoch_order = (seed, epoch), order
+        return self._epoch_order[1]
+
+    def shuffle(self, seed: int, epoch: int, number: int) -> np.ndarray:
+        """
+        The order in which the given epoch visits the samples of one shard.
+        Kept for as many shards as are decompressed.
+        """
+        key = seed, epoch, number
+        try:
+            self._shuffles.move_to_end(key)
+            return self._shuffles[key]
+        except KeyError:
+            pass
+        shuffle = np.random.RandomState([seed, epoch, number]).permutation(
+            int(self.sizes[number])
+        )
+        self._shuffles[key] = shuffle
+        while len(self._shuffles) > self.CACHE_SIZE:
+            self._shuffles.popitem(last=False)
+        return shuffle
+
+    def shard(self, number: int) -> Samples:
+        """
+        Returns the decompressed contexts and targets of one shard.
+        """
+        try:
+            self._cache.move_to_end(number)
+            return self._cache[number]
+        except KeyError:
+            pass
+        with np.load(os.fspath(self.path / self.filenames[number])) as shard:
+            samples = shard['contexts'], shard['targets']
+        self._cache[number] = samples
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return samples
+
+
+def export_shards(batches: 'LoopBatchesEndlessly', path: Path) -> None:
+    """
+    Writes every sample of the first epoch of the batches to a new shard
+    directory, one batch per shard.
+    """
+    assert not path.exists(), f"Refusing to overwrite {path}"
+    temporary_path = path.with_name(path.name + '.incomplete')
+    temporary_path.mkdir(parents=True, exist_ok=True)
+
+    filenames: List[str] = []
+    sizes: List[int] = []
+    for index in range(batches.batches_per_epoch):
+        contexts, targets = batches.samples(0, index)
+        filename = f'shard-{index:05d}.npz'
+        np.savez_compressed(os.fspath(temporary_path / filename),
+                            contexts=contexts, targets=targets)
+        filenames.append(filename)
+        sizes.append(len(targets))
+
+    manifest = {
+        'filehashes': digest(batches.filehashes),
+        'context_length': batches.context_length,
+        'backwards': batches.backwards,
+        'seed': batches.seed,
+        'shards': filenames,
+        'sizes': sizes,
+    }
+    with open(temporary_path / MANIFEST_FILENAME, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    temporary_path.rename(path)
+
+
+def shards_name(filehashes: Iterable[str], *,
+                context_length: int, backwards: bool) -> str:
+    """
+    Names the shard directory of the given parameters.
+
+    >>> shards_name({'abc', 'def'}, context_length=9, backwards=False)
+    'forwards-9-d53d6b91af7caf8f'
+    """
+    direction = 'backwards' if backwards else 'forwards'
+    return f"{direction}-{context_length}-{digest(filehashes)[:16]}"
+
+
+def digest(filehashes: Iterable[str]) -> str:
+    """
+    Identifies a set of files, regardless of their order.
+    """
+    return hashlib.sha256('\n'.join(sorted(filehashes)).encode('UTF-8')).hexdigest()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+# Copyright 2017 Eddie Antonio Santos <easantos@ualberta.ca>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures where the time goes while training.
+"""
+
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+FIELDS = ('epoch seconds samples samples_per_second '
+          'wait_time step_time io_time encode_time').split()
+
+
+class PipelineStats:
+    """
+    Accumulates the time spent producing batches, in seconds.
+
+    io_time is the time spent reading (and windowing) samples, and
+    encode_time is the time spent one-hot encoding them.
+    """
+    __slots__ = 'batches', 'samples', 'io_time', 'encode_time'
+
+    def __init__(self, batches: int=0, samples: int=0,
+                 io_time: float=0., encode_time: float=0.) -> None:
+        self.batches = batches
+        self.samples = samples
+        self.io_time = io_time
+        self.encode_time = encode_time
+
+    def add(self, other: 'PipelineStats') -> None:
+        self.batches += other.batches
+        self.samples += other.samples
+        self.io_time += other.io_time
+        self.encode_time += other.encode_time
+
+    def copy(self) -> 'PipelineStats':
+        return PipelineStats(self.batches, self.samples,
+                             self.io_time, self.encode_time)
+
+    def __sub__(self, other: 'PipelineStats') -> 'PipelineStats':
+        return PipelineStats(self.batches - other.batches,
+                             self.samples - other.samples,
+                             self.io_time - other.io_time,
+                             self.encode_time - other.encode_time)
+
+    def __repr__(self) -> str:
+        return (f"PipelineStats(batches={self.batches}, "
+                f"samples={self.samples}, "
+                f"io_time={self.io_time:.3f}, "
+                f"encode_time={self.encode_time:.3f})")
+
+
+class ThroughputLogger:
+    """
+    Keras callback that writes the training throughput of every epoch to a
+    CSV file, and a summary of all epochs to the manifest. Quacks like a
+    keras.callbacks.Callback.
+
+    wait_time is the time the model spent waiting for the next batch, and
+    step_time is the time spent training on batches. io_time and
+    encode_time are measured by the pipeline (see PipelineStats); when
+    batches are produced in parallel, they add up the time of every worker.
+    """
+
+    def __init__(self, stats: PipelineStats, *,
+                 csv_path: Path, manifest_path: Path) -> None:
+        self.stats = stats
+        self.csv_path = csv_path
+        self.manifest_path = manifest_path
+        self.epochs: List[Dict[str, Any]] = []
+        self.model: Any = None
+        self.params: Dict[str, Any] = {}
+
+    def set_params(self, params: Dict[str, Any]) -> None:
+        self.params = params
+
+    def set_model(self, model: Any) -> None:
+        self.model = model
+
+    def on_train_begin(self, logs: Dict[str, Any]=None) -> None:
+        pass
+
+    def on_epoch_begin(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        self._epoch_start = self._last_batch_end = time.perf_counter()
+        self._stats_at_start = self.stats.copy()
+        self._samples = 0
+        self._wait_time = 0.
+        self._step_time = 0.
+
+    def on_batch_begin(self, batch: int, logs: Dict[str, Any]=None) -> None:
+        self._batch_start = time.perf_counter()
+        self._wait_time += self._batch_start - self._last_batch_end
+
+    def on_batch_end(self, batch: int, logs: Dict[str, Any]=None) -> None:
+        self._last_batch_end = time.perf_counter()
+        self._step_time += self._last_batch_end - self._batch_start
+        self._samples += (logs or {}).get('size', 0)
+
+    def on_epoch_end(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        seconds = time.perf_counter() - self._epoch_start
+        pipeline = self.stats - self._stats_at_start
+        row = dict(epoch=epoch,
+                   seconds=seconds,
+                   samples=self._samples,
+                   samples_per_second=self._samples / seconds,
+                   wait_time=self._wait_time,
+                   step_time=self._step_time,
+                   io_time=pipeline.io_time,
+                   encode_time=pipeline.encode_time)
+        self.epochs.append(row)
+        self.write_row(row)
+        self.write_summary()
+
+    def on_train_end(self, logs: Dict[str, Any]=None) -> None:
+        pass
+
+    def write_row(self, row: Dict[str, Any]) -> None:
+        new_file = not self.csv_path.exists()
+        with open(self.csv_path, 'a') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def write_summary(self) -> None:
+        with open(self.manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        manifest['throughput'] = summarize(self.epochs)
+        with open(self.manifest_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+
+
+def summarize(epochs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Totals the throughput of several epochs.
+
+    >>> summarize([dict(epoch=0, seconds=2., samples=100, wait_time=1.),
+    ...            dict(epoch=1, seconds=3., samples=150, wait_time=0.5)])
+    {'epochs': 2, 'seconds': 5.0, 'samples': 250, 'wait_time': 1.5, 'samples_per_second': 50.0}
+    """
+    if not epochs:
+        return None
+    totals: Dict[str, Any] = {'epochs': len(epochs)}
+    for field in FIELDS:
+        if field in ('epoch', 'samples_per_second') or field not in epochs[0]:
+            continue
+        totals[field] = sum(epoch[field] for epoch in epochs)
+    totals['samples_per_second'] = totals['samples'] / totals['seconds']
+    return totals
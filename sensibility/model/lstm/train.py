@@ -23,19 +23,25 @@ import argparse
 import json
 import logging
 import os
+import signal
 import sys
 import typing
 import warnings
+from contextlib import closing
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence, Set, Tuple, cast
+from typing import (Any, Dict, Iterable, List, NamedTuple, Optional, Sequence,
+                    Set, Tuple, Union, cast)
 
-from sensibility._paths import (get_training_set_path, get_validation_set_path,
+from sensibility._paths import (get_packed_vectors_path, get_shards_path,
+                                get_training_set_path, get_validation_set_path,
                                 get_vectors_path)
 from sensibility.language import language
 from sensibility.miner.util import filehashes
 from sensibility.utils import symlink_within_dir
 
-from .loop_batches import LoopBatchesEndlessly
+from .loop_batches import LoopBatchesEndlessly, LoopDualBatchesEndlessly
+from .shards import shards_name
+from .throughput import ThroughputLogger
 
 # === Default command line arguments === #
 
@@ -51,11 +57,31 @@ LEARNING_RATE = 0.001
 PATIENCE = 3
 OPTIMIZER = 'rmsprop'
 
+# Seeds the order in which samples are visited on every epoch.
+SEED = 0
+# Number of processes that produce batches (0 produces them in-process).
+WORKERS = 1
+
 # === Other module-wide globals === #
 
 logger = logging.getLogger(__name__)
 INDEFINITE = 2 ** 32 - 1  # Yes, 2**32 is technically infinity
 
+# The (epoch, batch) of a training batch.
+Position = Tuple[int, int]
+
+
+class ResumePoint(NamedTuple):
+    """
+    Where to continue training a model from: its weights, the position of
+    the next batch, and the state of EarlyStopping, if known. A model that
+    was stopped early (see SideBySide) is not trained any further.
+    """
+    weights: Path
+    position: Position
+    stopped: bool = False
+    early_stopping: Optional[Dict[str, Any]] = None
+
 
 # === The big training class === #
 
@@ -73,6 +99,8 @@ class ModelDescription:
     # Keras is poorly behaved, so only import these types when type-checking.
     if typing.TYPE_CHECKING:
         from keras.models import Sequential
+        from keras.optimizers import Optimizer
+        from .callbacks import PipelinePosition
 
     def __init__(self, *,
                  backwards: bool,
@@ -87,7 +115,12 @@ class ModelDescription:
                  optimizer: str,
                  training_set: Set[str],
                  validation_set: Set[str],
-                 vectors_path: Path) -> None:
+                 vectors_path: Path,
+                 shards_dir: Path=None,
+                 mask_padding: bool=False,
+                 seed: int=SEED,
+                 workers: int=WORKERS,
+                 allow_sqlite: bool=False) -> None:
 
         self.backwards = backwards
         self.output_dir = output_dir
@@ -98,6 +131,9 @@ class ModelDescription:
         self.dropout = dropout
         self.optimizer = optimizer
         self.patience = patience
+        self.mask_padding = mask_padding
+        self.seed = seed
+        self.workers = workers
 
         # The training and validation data. Note, each is provided explicitly,
         # but we ask for a partition for labelling purposes.
@@ -105,6 +141,12 @@ class ModelDescription:
         self.training_set = training_set
         self.validation_set = validation_set
         self.vectors_path = vectors_path
+        # Whether vectors_path may be an SQLite3 vector database, to be loaded
+        # into memory in its entirety.
+        self.allow_sqlite = allow_sqlite
+        # Where to look for pre-built shards of the training and validation
+        # sets (see: sensibility sources export-shards).
+        self.shards_dir = shards_dir
 
     def train(self) -> None:
         """
@@ -131,20 +173,69 @@ class ModelDescription:
         """
         assert self.incomplete_path.exists()
 
-        # Continue from a saved intermediate model.
-        intermediates = list(self.incomplete_path.glob('intermediate-*.hdf5'))
+        # Continue from exactly where training was interrupted, or from a
+        # saved intermediate model. There might not be either, so pretend
+        # we're starting from scratch.
+        resume = self.resume_point()
+        if resume is not None and resume.stopped:
+            # Training had already finished.
+            self.incomplete_path.rename(self.output_dir)
+            return
+        self._train(resume=resume)
 
-        if len(intermediates) > 0:
-            # There are intermediate files!
-            # Figure out the last epoch, and continue from there.
-            last_epoch = max(intermediates, key=epoch_from_path)
-            self._train(continue_from=last_epoch)
-        else:
-            # There might not be an intermediate file, so pretend we're
-            # starting from scratch.
-            self._train()
+    def resume_point(self) -> Optional[ResumePoint]:
+        """
+        Returns the weights to continue training from, and the position of
+        the next batch to train on, if any.
+        """
+        state = self.load_pipeline_state()
+        if state is not None:
+            return state
+        last_epoch = self.last_intermediate()
+        if last_epoch is None:
+            return None
+        return ResumePoint(last_epoch, (epoch_from_path(last_epoch) + 1, 0))
+
+    def save_pipeline_state(self, point: ResumePoint) -> None:
+        """
+        Saves the position of the next batch to train on, after the given
+        weights. Since every batch is determined by the seed, epoch and
+        batch number, that's all that's needed to continue training.
+        """
+        epoch, batch = point.position
+        state = dict(seed=self.seed, epoch=epoch, batch=batch,
+                     weights=point.weights.name, stopped=point.stopped,
+                     early_stopping=point.early_stopping)
+        temporary_path = self.pipeline_path.with_suffix('.incomplete')
+        with open(temporary_path, 'w') as state_file:
+            json.dump(state, state_file, indent=4)
+        temporary_path.replace(self.pipeline_path)
+
+    def load_pipeline_state(self) -> Optional[ResumePoint]:
+        try:
+            with open(self.pipeline_path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return None
+        weights = self.incomplete_path / state['weights']
+        if state['seed'] != self.seed or not weights.exists():
+            logger.warning("Ignoring stale pipeline state: %s",
+                           self.pipeline_path)
+            return None
+        return ResumePoint(weights, (state['epoch'], state['batch']),
+                           stopped=state.get('stopped', False),
+                           early_stopping=state.get('early_stopping'))
+
+    def last_intermediate(self) -> Optional[Path]:
+        """
+        Returns the intermediate model of the last epoch, if any.
+        """
+        intermediates = list(self.incomplete_path.glob('intermediate-*.hdf5'))
+        if len(intermediates) == 0:
+            return None
+        return max(intermediates, key=epoch_from_path)
 
-    def _train(self, continue_from: Path = None) -> None:
+    def _train(self, resume: ResumePoint = None) -> None:
         logger.info("Saving model to %s", self.model_path)
         logger.info("%d training files", len(self.training_set))
         logger.info("%d validation files", len(self.validation_set))
@@ -157,65 +248,97 @@ class ModelDescription:
         logger.info(f"Training on {training_batches.samples_per_epoch} samples "
                     f"using a batch size of {self.batch_size}")
 
-        from keras.callbacks import ModelCheckpoint, CSVLogger, EarlyStopping
         model = self.compile_model()
 
         # Load weights if we're continuing
-        if continue_from is None:
-            initial_epoch = 0
-        else:
-            logger.info('Continuing from %s', continue_from)
-            model.load_weights(str(continue_from))
-            initial_epoch = epoch_from_path(continue_from) + 1
+        position = (0, 0)
+        if resume is not None:
+            logger.info('Continuing from %s', resume.weights)
+            model.load_weights(str(resume.weights))
+            position = resume.position
 
+        tracker = self.tracker(position, resume)
         try:
-            model.fit_generator(
-                iter(training_batches),
-                self._batches_per_epoch(training_batches.samples_per_epoch),
-                epochs=INDEFINITE,  # Train until EarlyStopping says so.
-                validation_data=iter(validation_batches),
-                validation_steps=self._batches_per_epoch(validation_batches.samples_per_epoch),
-                verbose=0,  # Use a callback instead to monitor progress.
-                callbacks=[
-                    ModelCheckpoint(str(self.weight_path_pattern),
-                                    save_best_only=False,
-                                    save_weights_only=False,
-                                    mode='auto'),
-                    CSVLogger(str(self.progress_path), append=True),
-                    EarlyStopping(patience=self.patience, mode='auto')
-                ],
-                use_multiprocessing=True,
-                initial_epoch=initial_epoch,
-            )
+            fit_from(position, model, training_batches, validation_batches,
+                     callbacks=self.callbacks(training_batches, tracker))
         except KeyboardInterrupt:
             model.save(str(self.interrupted_path))
+            self.save_pipeline_state(
+                tracker.resume_point(self.interrupted_path)
+            )
         else:
             # Move the file over to the correct file path, so that Make can
             # confirm that this model has completed training.
             self.incomplete_path.rename(self.output_dir)
 
+    def tracker(self, position: Position,
+                resume: ResumePoint = None) -> 'PipelinePosition':
+        """
+        The Keras callback that saves where to resume training from.
+        """
+        from .callbacks import PipelinePosition, ResumableEarlyStopping
+        early_stopping = ResumableEarlyStopping(
+            state=resume.early_stopping if resume is not None else None,
+            patience=self.patience, mode='auto'
+        )
+        return PipelinePosition(self, position, early_stopping)
+
+    def callbacks(self, training_batches: LoopBatchesEndlessly,
+                  tracker: 'PipelinePosition') -> List[Any]:
+        """
+        The Keras callbacks that save and monitor this model.
+        """
+        from keras.callbacks import ModelCheckpoint, CSVLogger
+        return [
+            ModelCheckpoint(str(self.weight_path_pattern),
+                            save_best_only=False,
+                            save_weights_only=False,
+                            mode='auto'),
+            CSVLogger(str(self.progress_path), append=True),
+            ThroughputLogger(training_batches.stats,
+                             csv_path=self.throughput_path,
+                             manifest_path=self.manifest_path),
+            tracker.early_stopping,
+            tracker,
+        ]
+
     def compile_model(self) -> 'Sequential':
+        model = self.build_model()
+        model.compile(loss='categorical_crossentropy',
+                      optimizer=self.create_optimizer(),
+                      metrics=['categorical_accuracy'])
+        return model
+
+    def build_model(self) -> 'Sequential':
+        """
+        Returns the layers of this model, uncompiled.
+        """
         from keras.models import Sequential
         from keras.layers import Dense, Activation, Dropout
-        from keras.layers import LSTM
-        from keras.optimizers import Optimizer, RMSprop, Nadam, Adam
+        from keras.layers import LSTM, Masking
 
         vocabulary = language.vocabulary
 
         model = Sequential()
         input_shape = (self.context_length, len(vocabulary))
+        input_options: Dict[str, Any] = dict(input_shape=input_shape)
+
+        if self.mask_padding:
+            # Padding is encoded as all-zero vectors; skip it entirely.
+            model.add(Masking(mask_value=0., **input_options))
+            input_options = {}
 
         if len(self.hidden_layers) == 1:
             # One LSTM layer is simple:
             first_layer = self.hidden_layers[0]
-            model.add(LSTM(first_layer, input_shape=input_shape))
+            model.add(LSTM(first_layer, **input_options))
         else:
             first_layer, *middle_layers, last_layer = self.hidden_layers
             # The first layer defines the input, so special case it.  Since
             # there are more layers, all higher-up layers must return
             # sequences.
-            model.add(LSTM(first_layer, input_shape=input_shape,
-                           return_sequences=True))
+            model.add(LSTM(first_layer, return_sequences=True,
+                           **input_options))
             # Add the middle LSTM layers (if any).
             # These layers must also return sequences.
             for layer in middle_layers:
@@ -233,6 +356,10 @@ class ModelDescription:
         model.add(Dense(len(vocabulary)))
         # Softmax makes the output look like a probability distribution.
         model.add(Activation('softmax'))
+        return model
+
+    def create_optimizer(self) -> 'Optimizer':
+        from keras.optimizers import Optimizer, RMSprop, Nadam, Adam
 
         optimizer: Optimizer
         if self.optimizer == 'rmsprop':
@@ -244,11 +371,7 @@ class ModelDescription:
         else:
             logger.error("Unknown optimizer: %r", self.optimizer)
             sys.exit(2)
-
-        model.compile(loss='categorical_crossentropy',
-                      optimizer=optimizer,
-                      metrics=['categorical_accuracy'])
-        return model
+        return optimizer
 
     def create_batches(self) -> Batches:
         """
@@ -260,17 +383,34 @@ class ModelDescription:
             vectors_path=self.vectors_path,
             batch_size=self.batch_size,
             context_length=self.context_length,
-            backwards=self.backwards
+            backwards=self.backwards,
+            seed=self.seed,
+            workers=self.workers,
+            mask_padding=self.mask_padding,
+            shards_path=self.shards_path(self.training_set),
+            allow_sqlite=self.allow_sqlite,
         )
         validation = LoopBatchesEndlessly(
             filehashes=self.validation_set,
             vectors_path=self.vectors_path,
             batch_size=self.batch_size,
             context_length=self.context_length,
-            backwards=self.backwards
+            backwards=self.backwards,
+            seed=self.seed,
+            workers=self.workers,
+            mask_padding=self.mask_padding,
+            shards_path=self.shards_path(self.validation_set),
+            allow_sqlite=self.allow_sqlite,
         )
         return training, validation
 
+    def shards_path(self, filehashes: Set[str]) -> Optional[Path]:
+        if self.shards_dir is None:
+            return None
+        return self.shards_dir / shards_name(filehashes,
+                                             context_length=self.context_length,
+                                             backwards=self.backwards)
+
     def save_manifest(self) -> None:
         """
         Saves a manifest with all of the relevant parameters for training this
@@ -279,21 +419,13 @@ class ModelDescription:
         properties = (
             'direction partition training_set_size validation_set_size '
             'hidden_layers context_length batch_size '
-            'dropout optimizer learning_rate patience '
+            'dropout optimizer learning_rate patience seed mask_padding '
         ).split()
 
         manifest = {prop: getattr(self, prop) for prop in properties}
         with open(self.manifest_path, 'w') as summary_file:
             json.dump(manifest, summary_file, indent=4)
 
-    def _batches_per_epoch(self, training_samples: int) -> int:
-        """
-        Number of batches per sample.
-        """
-        # TODO: Move this method to batch?
-        return (training_samples // self.batch_size +
-                bool(training_samples % self.batch_size))
-
     def _ensure_vectors_exist(self) -> None:
         if not self.vectors_path.exists():
             raise Exception(f"Could not find vectors at: {self.vectors_path}")
@@ -310,6 +442,14 @@ class ModelDescription:
     def progress_path(self) -> Path:
         return self.incomplete_path / f"progress.csv"
 
+    @property
+    def throughput_path(self) -> Path:
+        return self.incomplete_path / f"throughput.csv"
+
+    @property
+    def pipeline_path(self) -> Path:
+        return self.incomplete_path / f"pipeline.json"
+
     @property
     def manifest_path(self) -> Path:
         return self.incomplete_path / f"manifest.json"
@@ -337,6 +477,320 @@ class ModelDescription:
         return 'backwards' if self.backwards else 'forwards'
 
 
+def fit_from(position: Position, model: Any,
+             training_batches: LoopBatchesEndlessly,
+             validation_batches: LoopBatchesEndlessly, *,
+             callbacks: List[Any]) -> None:
+    """
+    Trains the model from the given (epoch, batch) position of the training
+    batches, until EarlyStopping says so. An epoch that was interrupted is
+    finished first, starting from exactly the next batch.
+    """
+    def fit(initial_epoch: int, batch: int, epochs: int) -> None:
+        # Keras never closes its generators, and each one owns a pool of
+        # worker processes (see produce_in_parallel()), so close them here.
+        with closing(training_batches.iterate_from(initial_epoch,
+                                                   batch)) as training, \
+                closing(validation_batches.iterate_from(0, 0)) as validation:
+            model.fit_generator(
+                training,
+                training_batches.batches_per_epoch - batch,
+                epochs=epochs,
+                validation_data=validation,
+                validation_steps=validation_batches.batches_per_epoch,
+                verbose=0,  # Use a callback instead to monitor progress.
+                callbacks=callbacks,
+                # The batches are produced by their own pool of processes
+                # (see LoopBatchesEndlessly), so run the generators in
+                # threads.
+                use_multiprocessing=False,
+                initial_epoch=initial_epoch,
+            )
+
+    epoch, batch = position
+    if batch > 0:
+        fit(epoch, batch, epochs=epoch + 1)
+        if model.stop_training:
+            return
+        epoch += 1
+    fit(epoch, 0, epochs=INDEFINITE)  # Train until EarlyStopping says so.
+
+
+class DualModelDescription:
+    """
+    Describes a forwards AND a backwards LSTM model, trained side by side, in
+    one process, from the same batches.
+
+    The two models are the two outputs of one Keras model. They share no
+    weights, so each model is trained as if it were trained alone; however,
+    the files are loaded and the samples are shuffled and gathered only once
+    for both of them. Once one model stops early, the other continues
+    alone (see SideBySide).
+    """
+
+    def __init__(self, *, output_prefix: Path, **kwargs: Any) -> None:
+        self.forwards = ModelDescription(
+            backwards=False, output_dir=Path(f"{output_prefix}.forwards"),
+            **kwargs
+        )
+        self.backwards = ModelDescription(
+            backwards=True, output_dir=Path(f"{output_prefix}.backwards"),
+            **kwargs
+        )
+        self.descriptions = (self.forwards, self.backwards)
+
+    def train(self) -> None:
+        """
+        Start (or continue) training both models.
+        """
+        for description in self.descriptions:
+            if not description.incomplete_path.exists():
+                assert not description.output_dir.exists()
+                description.incomplete_path.mkdir()
+                description.save_manifest()
+
+        resume_points = [d.resume_point() for d in self.descriptions]
+        if all(point is None for point in resume_points):
+            self._train()
+            return
+
+        # The models that are still training must continue from the same
+        # batch; a model that stopped early stays where it stopped.
+        running = [point for point in resume_points
+                   if point is None or not point.stopped]
+        if not running:
+            # Training had already finished.
+            for description in self.descriptions:
+                description.incomplete_path.rename(description.output_dir)
+            return
+        positions = {point.position for point in running if point is not None}
+        if None in running or len(positions) > 1:
+            logger.error("Cannot resume: the models stopped at different "
+                         "batches. Remove %s to start over.",
+                         ' and '.join(str(d.incomplete_path)
+                                      for d in self.descriptions))
+            sys.exit(1)
+        self._train(resume_points)
+
+    def _train(self,
+               resume_points: Sequence[Optional[ResumePoint]] = None) -> None:
+        fw = self.forwards
+        logger.info("Saving models to %s and %s",
+                    self.forwards.output_dir, self.backwards.output_dir)
+        logger.info("%d training files", len(fw.training_set))
+        logger.info("%d validation files", len(fw.validation_set))
+        logger.info("Loading file vectors from %s", fw.vectors_path)
+
+        fw._ensure_vectors_exist()
+        training_batches, validation_batches = self.create_batches()
+
+        logger.info(f"Training on {training_batches.samples_per_epoch} samples "
+                    f"using a batch size of {fw.batch_size}")
+
+        from keras import backend as K
+        from keras.models import Model
+        models = [description.build_model()
+                  for description in self.descriptions]
+        model = Model(inputs=[m.input for m in models],
+                      outputs=[m.output for m in models])
+        # Variables, so that a model that stopped can stop learning.
+        loss_weights = {output_name: K.variable(1.)
+                        for output_name in model.output_names}
+        model.compile(loss='categorical_crossentropy',
+                      loss_weights=loss_weights,
+                      optimizer=fw.create_optimizer(),
+                      metrics=['categorical_accuracy'])
+
+        # Load weights if we're continuing. A model that stopped early stays
+        # frozen; the other continues from its position.
+        resume_points = resume_points or [None] * len(self.descriptions)
+        position = (0, 0)
+        stopped: Set[str] = set()
+        for output_name, submodel, point in zip(model.output_names, models,
+                                                resume_points):
+            if point is None:
+                continue
+            logger.info('Continuing from %s', point.weights)
+            submodel.load_weights(str(point.weights))
+            if point.stopped:
+                stopped.add(output_name)
+            else:
+                position = point.position
+
+        trackers = [description.tracker(position, point)
+                    for description, point in zip(self.descriptions,
+                                                  resume_points)]
+        side_by_side = SideBySide({
+            output_name: (submodel,
+                          description.callbacks(training_batches, tracker))
+            for output_name, submodel, description, tracker
+            in zip(model.output_names, models, self.descriptions, trackers)
+        }, loss_weights=loss_weights, stopped=stopped)
+
+        try:
+            fit_from(position, model, training_batches, validation_batches,
+                     callbacks=[side_by_side])
+        except KeyboardInterrupt:
+            side_by_side.restore_stopped()
+            for output_name, submodel, description, tracker in zip(
+                    model.output_names, models, self.descriptions, trackers):
+                if output_name in side_by_side.stopped:
+                    # Its state was saved when it stopped.
+                    continue
+                submodel.save(str(description.interrupted_path))
+                description.save_pipeline_state(
+                    tracker.resume_point(description.interrupted_path)
+                )
+        else:
+            for description in self.descriptions:
+                description.incomplete_path.rename(description.output_dir)
+
+    def create_batches(self) -> ModelDescription.Batches:
+        """
+        Return a tuple of infinite training and validation examples, each
+        batch having both forwards and backwards inputs.
+        """
+        fw = self.forwards
+        training = LoopDualBatchesEndlessly(
+            filehashes=fw.training_set,
+            vectors_path=fw.vectors_path,
+            batch_size=fw.batch_size,
+            context_length=fw.context_length,
+            seed=fw.seed,
+            workers=fw.workers,
+            mask_padding=fw.mask_padding,
+            allow_sqlite=fw.allow_sqlite,
+        )
+        validation = LoopDualBatchesEndlessly(
+            filehashes=fw.validation_set,
+            vectors_path=fw.vectors_path,
+            batch_size=fw.batch_size,
+            context_length=fw.context_length,
+            seed=fw.seed,
+            workers=fw.workers,
+            mask_padding=fw.mask_padding,
+            allow_sqlite=fw.allow_sqlite,
+        )
+        return training, validation
+
+
+class SideBySide:
+    """
+    Keras callbacks for models trained side by side as the outputs of one
+    model. Quacks like a keras.callbacks.Callback.
+
+    Each model gets its own callbacks, which see the model itself, and only
+    the logs of its own output. Training stops once every model has been
+    stopped.
+
+    When a model is stopped (e.g., by EarlyStopping), the weight of its loss
+    is set to zero, so it no longer learns; its callbacks are no longer
+    called (except on_train_end); and its weights are restored to those it
+    had when it stopped, in case the optimizer's momentum moved them since.
+    The models named in `stopped` had stopped before training resumed.
+    """
+
+    def __init__(self, callbacks: Dict[str, Tuple[Any, List[Any]]],
+                 loss_weights: Dict[str, Any],
+                 stopped: Iterable[str] = ()) -> None:
+        # Output name -> (model, the model's callbacks)
+        self.callbacks = callbacks
+        # Output name -> the backend variable weighting the output's loss
+        self.loss_weights = loss_weights
+        # Output name -> the weights of the model when it stopped
+        self.stopped: Dict[str, List[Any]] = {}
+        self.model: Any = None
+        for output_name in stopped:
+            self.stop(output_name)
+
+    def set_params(self, params: Dict[str, Any]) -> None:
+        for _submodel, callbacks in self.callbacks.values():
+            for callback in callbacks:
+                callback.set_params(params)
+
+    def set_model(self, model: Any) -> None:
+        self.model = model
+        for output_name, (submodel, callbacks) in self.callbacks.items():
+            submodel.stop_training = output_name in self.stopped
+            for callback in callbacks:
+                callback.set_model(submodel)
+
+    def on_train_begin(self, logs: Dict[str, Any]=None) -> None:
+        self._call('on_train_begin', logs)
+
+    def on_epoch_begin(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        self._call('on_epoch_begin', logs, epoch)
+
+    def on_batch_begin(self, batch: int, logs: Dict[str, Any]=None) -> None:
+        self._call('on_batch_begin', logs, batch)
+
+    def on_batch_end(self, batch: int, logs: Dict[str, Any]=None) -> None:
+        self._call('on_batch_end', logs, batch)
+
+    def on_epoch_end(self, epoch: int, logs: Dict[str, Any]=None) -> None:
+        self._call('on_epoch_end', logs, epoch)
+        for output_name, (submodel, _callbacks) in self.callbacks.items():
+            if submodel.stop_training and output_name not in self.stopped:
+                logger.info("Stopped training %s", output_name)
+                self.stop(output_name)
+        self.model.stop_training = len(self.stopped) == len(self.callbacks)
+
+    def stop(self, output_name: str) -> None:
+        """
+        Freezes one model at its current weights.
+        """
+        from keras import backend as K
+        submodel, _callbacks = self.callbacks[output_name]
+        self.stopped[output_name] = submodel.get_weights()
+        K.set_value(self.loss_weights[output_name], 0.)
+
+    def on_train_end(self, logs: Dict[str, Any]=None) -> None:
+        self.restore_stopped()
+        self._call('on_train_end', logs, including_stopped=True)
+
+    def restore_stopped(self) -> None:
+        """
+        Restores the weights every stopped model had when it stopped.
+        """
+        for output_name, weights in self.stopped.items():
+            submodel, _callbacks = self.callbacks[output_name]
+            submodel.set_weights(weights)
+
+    def _call(self, method: str, logs: Optional[Dict[str, Any]],
+              *args: int, including_stopped: bool = False) -> None:
+        for output_name, (_submodel, callbacks) in self.callbacks.items():
+            if output_name in self.stopped and not including_stopped:
+                continue
+            output_logs = logs_of_output(logs or {}, output_name)
+            for callback in callbacks:
+                getattr(callback, method)(*args, output_logs)
+
+
+def logs_of_output(logs: Dict[str, Any], output_name: str) -> Dict[str, Any]:
+    """
+    Returns the logs of one output of a multi-output model, named as if the
+    model had only that output.
+
+    >>> logs = {'loss': 3.0, 'dense_1_loss': 1.0, 'dense_2_loss': 2.0,
+    ...         'val_dense_1_categorical_accuracy': 0.5, 'size': 32}
+    >>> sorted(logs_of_output(logs, 'dense_1').items())
+    [('loss', 1.0), ('size', 32), ('val_categorical_accuracy', 0.5)]
+    """
+    prefix = output_name + '_'
+    # The metrics of the combined model, and of every other output.
+    metrics = ('loss', 'categorical_accuracy')
+    output_logs: Dict[str, Any] = {}
+    for key, value in logs.items():
+        validation = 'val_' if key.startswith('val_') else ''
+        name = key[len(validation):]
+        if name.startswith(prefix):
+            output_logs[validation + name[len(prefix):]] = value
+        elif not name.endswith(metrics):
+            # Not a metric (e.g., batch number and size), so keep it as-is.
+            output_logs[key] = value
+    return output_logs
+
+
 def validation_loss(filename: Path) -> float:
     """
     Determine the validation loss encoded in a model filename.
@@ -396,11 +850,14 @@ group = parser.add_mutually_exclusive_group(required=True)
 
 # Output options
 parser.add_argument('-o', '--output-dir', type=Path, required=True,
-                    help=f"Name of the directory to output")
+                    help=f"Name of the directory to output (with --both, "
+                    "outputs to OUTPUT_DIR.forwards and OUTPUT_DIR.backwards)")
 
 # LSTM options.
 group.add_argument('-f', '--forwards', action='store_true')
 group.add_argument('-b', '--backwards', action='store_true')
+group.add_argument('--both', action='store_true',
+                   help='train forwards and backwards models side by side')
 parser.add_argument('--hidden-layers', type=layers, default=HIDDEN_LAYERS,
                     help=f"default: {HIDDEN_LAYERS}")
 parser.add_argument('--context-length', type=int, default=CONTEXT_LENGTH,
@@ -420,6 +877,17 @@ parser.add_argument('--optimizer', choices=('rmsprop', 'adam', 'nadam'),
 parser.add_argument('--patience', type=int, default=PATIENCE,
                     help='Number of bad epochs to wait before stopping'
                     f' (default: {PATIENCE})')
+parser.add_argument('--mask-padding', action='store_true',
+                    help='skip the padding at the edges of files')
+parser.add_argument('--seed', type=int, default=SEED,
+                    help=f"Seeds the order of samples (default: {SEED})")
+parser.add_argument('--workers', type=int, default=WORKERS,
+                    help='Number of processes producing batches'
+                    f' (default: {WORKERS})')
+parser.add_argument('--allow-sqlite', action='store_true',
+                    help='if the vectors of the partition are not packed'
+                    ' (see: sensibility sources pack-vectors), load every'
+                    ' vector from the vector database into memory')
 
 # GPU settings.
 parser.add_argument('--gpu', type=int, default=None,
@@ -431,6 +899,9 @@ def main() -> None:
     logging.basicConfig(level=logging.INFO)
     args = parser.parse_args()
 
+    # Save progress when preempted, just like with ^C.
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+
     # Get the appropriate sets for the give partition
     partition = cast(int, args.partition)
     training_set = slurp(get_training_set_path(partition))
@@ -438,14 +909,23 @@ def main() -> None:
 
     configure_gpu(args.gpu)
 
+    # Use the packed vectors of this partition (see: sensibility sources
+    # pack-vectors), unless loading the vector database is allowed.
+    vectors_path = get_packed_vectors_path(partition)
+    if not vectors_path.exists():
+        if not args.allow_sqlite:
+            parser.error(f"{vectors_path} does not exist; create it with "
+                         f"`sensibility sources pack-vectors {partition}`, "
+                         "or use --allow-sqlite")
+        vectors_path = get_vectors_path()
+
     # Determine language first!
-    model = ModelDescription(
+    options = dict(
         partition=partition,
         training_set=subset(training_set, args.train_set_size),
         validation_set=subset(validation_set, args.validation_set_size),
-        vectors_path=get_vectors_path(),
-        backwards=args.backwards,
-        output_dir=args.output_dir,
+        vectors_path=vectors_path,
+        shards_dir=get_shards_path(partition),
         context_length=args.context_length,
         hidden_layers=args.hidden_layers,
         learning_rate=args.learning_rate,
@@ -453,11 +933,27 @@ def main() -> None:
         batch_size=args.batch_size,
         dropout=args.dropout,
         optimizer=args.optimizer,
+        mask_padding=args.mask_padding,
+        seed=args.seed,
+        workers=args.workers,
+        allow_sqlite=args.allow_sqlite,
     )
 
+    model: Union[ModelDescription, DualModelDescription]
+    if args.both:
+        model = DualModelDescription(output_prefix=args.output_dir, **options)
+    else:
+        model = ModelDescription(backwards=args.backwards,
+                                 output_dir=args.output_dir,
+                                 **options)
+
     model.train()
 
 
+def raise_keyboard_interrupt(signum: int, frame: Any) -> None:
+    raise KeyboardInterrupt
+
+
 def slurp(filename: Path) -> List[str]:
     """
     Read the file into one big list of filehashes.
@@ -69,7 +69,7 @@ class SourceVector(Sequence[Vind]):
         clsname = type(self).__name__
         return f"{clsname}([{', '.join(str(x) for x in self)}])"
 
-    def print(self, file: IO[str]=sys.stdout) -> None:
+    def print(self, file: IO[str]=None) -> None:
         """
         Prints the tokens to a file, using real tokens.
         """
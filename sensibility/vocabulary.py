@@ -18,9 +18,10 @@
 import json
 import warnings
 from os import PathLike
-from typing import Dict, Iterable, NewType, Optional, Sequence, Sized, cast
+from typing import (Any, Callable, Dict, Iterable, NewType, Optional,
+                    Sequence, Sized, cast)
 
-__all__ = 'Vocabulary', 'Entry', 'Vind'
+__all__ = 'Vocabulary', 'Entry', 'Vind', 'LazyVocabulary'
 
 # A vocabulary index that gets in your face.
 Vind = NewType('Vind', int)
@@ -147,3 +148,26 @@ class Vocabulary(Sized):
     unk_token = UNK_TOKEN
     start_token = START_TOKEN
     end_token = END_TOKEN
+
+
+class LazyVocabulary:
+    """
+    A class attribute that loads the vocabulary the first time it is used,
+    rather than when its class is defined.
+
+    >>> class Language:
+    ...     vocabulary = LazyVocabulary(lambda: print('Loading...') or 42)
+    >>> Language.vocabulary
+    Loading...
+    42
+    >>> Language().vocabulary
+    42
+    """
+    def __init__(self, load: Callable[[], Vocabulary]) -> None:
+        self.load = load
+        self.value: Optional[Vocabulary] = None
+
+    def __get__(self, obj: Any, cls: Any) -> Vocabulary:
+        if self.value is None:
+            self.value = self.load()
+        return self.value
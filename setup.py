@@ -1,4 +1,5 @@
 # -*- coding: UTF-8 -*-
+import re
 from os import path
 
 from setuptools import find_packages, setup  # type: ignore
@@ -11,9 +12,14 @@ def slurp(filename):
         return text_file.read()
 
 
+def version():
+    init = slurp(path.join(here, 'sensibility', '__init__.py'))
+    return re.search(r"^__version__ = '([^']+)'$", init, re.MULTILINE).group(1)
+
+
 setup(
     name='sensibility',
-    version='0.3.dev0',
+    version=version(),
 
     description='Syntax error finder and fixer',
     long_description=slurp(path.join(here, 'README.rst')),
@@ -0,0 +1,5 @@
+from typing import Any
+
+def variable(value: Any, dtype: str=None, name: str=None) -> Any: ...
+def set_value(x: Any, value: Any) -> None: ...
+def get_value(x: Any) -> Any: ...
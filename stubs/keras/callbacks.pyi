@@ -1,4 +1,17 @@
-class Callback: ...
+from typing import Any, Dict
+
+class Callback:
+    model: Any
+    params: Dict[str, Any]
+    def __init__(self) -> None: ...
+    def set_params(self, params: Dict[str, Any]) -> None: ...
+    def set_model(self, model: Any) -> None: ...
+    def on_epoch_begin(self, epoch: int, logs: Dict[str, Any]=None) -> None: ...
+    def on_epoch_end(self, epoch: int, logs: Dict[str, Any]=None) -> None: ...
+    def on_batch_begin(self, batch: int, logs: Dict[str, Any]=None) -> None: ...
+    def on_batch_end(self, batch: int, logs: Dict[str, Any]=None) -> None: ...
+    def on_train_begin(self, logs: Dict[str, Any]=None) -> None: ...
+    def on_train_end(self, logs: Dict[str, Any]=None) -> None: ...
 
 class ModelCheckpoint(Callback):
     def __init__(self, filepath: str, monitor: str='val_loss', verbose: int=0, save_best_only: int=False, save_weights_only: int=False, mode: str='auto', period: int=1) -> None: ...
@@ -7,4 +20,7 @@ class CSVLogger(Callback):
     def __init__(self, filename: str, separator: str=',', append: bool=False) -> None: ...
 
 class EarlyStopping(Callback):
+    wait: int
+    best: float
+    stopped_epoch: int
     def __init__(self, monitor: str='val_loss', min_delta: float=0, patience: int=0, verbose: int=0, mode: str='auto') -> None: ...
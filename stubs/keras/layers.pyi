@@ -1,13 +1,20 @@
-from typing import Tuple
+from typing import Any, Dict, List, Tuple
+
+from numpy import ndarray
 
 from . import ActivationFunction, Initializer, Regularizer
 
 class Layer:
     def __init__(self, input_shape: Tuple[int, ...]=None) -> None: ...
+    def get_config(self) -> Dict[str, Any]: ...
+    def get_weights(self) -> List[ndarray]: ...
 
 class Dense(Layer):
     def __init__(self, *args, **kwargs) -> None: ...
 
+class Masking(Layer):
+    def __init__(self, mask_value: float=0., **kwargs) -> None: ...
+
 class Dropout(Layer):
     def __init__(self, rate: float, **kwargs) -> None: ...
 
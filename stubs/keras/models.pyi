@@ -1,4 +1,4 @@
-from typing import Sequence, Iterator, Tuple
+from typing import Any, Dict, List, Sequence, Iterator, Tuple
 
 from numpy import ndarray
 
@@ -10,14 +10,24 @@ from .callbacks import Callback
 Sample = Tuple[ndarray, ndarray]
 
 class Model:
+    input: Any
+    output: Any
+    output_names: List[str]
+    layers: List[Layer]
+    stop_training: bool
+    def __init__(self, inputs=None, outputs=None, name: str=None) -> None: ...
     def compile(self, optimizer: Optimizer, loss: Loss, metrics: Sequence[Metric]=None, loss_weights=None, sample_weight_mode=None, **kwargs) -> None: ...
     def fit_generator(self, generator: Iterator[Sample], steps_per_epoch: int, epochs: int=1, verbose: int=1, callbacks: Sequence[Callback]=None, validation_data: Iterator[Sample]=None, validation_steps=None, class_weight=None, max_queue_size: int=10, workers: int=1, use_multiprocessing: bool=False, shuffle=True, initial_epoch: int=0) -> None: ...
     def predict(self, x, batch_size: int=32, verbose: int=0) -> ndarray: ...
     def save(self, path: str) -> None: ...
     def load_weights(self, path: str, by_name: bool=False) -> None: ...
+    def get_weights(self) -> List[ndarray]: ...
+    def set_weights(self, weights: List[ndarray]) -> None: ...
 
 class Sequential(Model):
+    def __init__(self, layers: Sequence[Layer]=None, name: str=None) -> None: ...
     def add(self, layer: Layer) -> None: ...
     def summary(self) -> None: ...
 
 def load_model(filename: str) -> Model: ...
+def model_from_config(config: Dict[str, Any], custom_objects: Dict[str, Any]=None) -> Model: ...
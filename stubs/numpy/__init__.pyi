@@ -1,4 +1,7 @@
+import builtins
 from typing import Any, Iterable, Iterator, NewType, Sequence, Sized, Tuple, TypeVar, Union
+
+from . import random
 T = TypeVar('T')
 
 class DataType(type):
@@ -7,26 +10,69 @@ class DataType(type):
 Shape = Union[int, Sequence[int]]
 
 bool = ...  # type: DataType
+float16 = ...  # type: DataType
 float32 = ...  # type: DataType
 float64 = ...  # type: DataType
+int8 = ...  # type: DataType
+int32 = ...  # type: DataType
+int64 = ...  # type: DataType
+uint8 = ...  # type: DataType
+
+newaxis = ...  # type: None
+
+class iinfo:
+    min = ...  # type: int
+    max = ...  # type: int
+    def __init__(self, dtype: DataType) -> None: ...
 
 class ndarray(Sized, Iterable[T]):
+    shape = ...  # type: Tuple[int, ...]
+    dtype = ...  # type: DataType
     def __setitem__(self, *i: Any) -> None: ...
     def __getitem__(self, *i: Any) -> T: ...
     def __matmul__(self, other: ndarray) -> Union[ndarray[T], T]: ...
-    def __add__(self, other: ndarray[T]) -> ndarray[T]: ...
-    def __mul__(self, other: ndarray[T]) -> ndarray[T]: ...
-    def __sub__(self, other: ndarray[T]) -> ndarray[T]: ...
+    def __add__(self, other: Any) -> ndarray[T]: ...
+    def __radd__(self, other: Any) -> ndarray[T]: ...
+    def __mul__(self, other: Any) -> ndarray[T]: ...
+    def __rmul__(self, other: Any) -> ndarray[T]: ...
+    def __sub__(self, other: Any) -> ndarray[T]: ...
+    def __ne__(self, other: Any) -> Any: ...
     def __truediv__(self, other: T) -> ndarray[T]: ...
     def __iter__(self) -> Iterator[T]: ...
     def __len__(self) -> int: ...
+    def any(self, axis: int=None) -> Any: ...
     def argmax(self) -> int: ...
-    def sum(self) -> float: ...
+    def astype(self, dtype: Union[DataType, str]) -> ndarray: ...
+    def max(self, axis: int=None, keepdims: builtins.bool=False) -> Any: ...
+    def sum(self, axis: int=None, keepdims: builtins.bool=False) -> Any: ...
+    def tolist(self) -> Any: ...
 
-def array(object: Sequence, dtype: DataType=None) -> ndarray[T]: ...
+def abs(x: Any) -> ndarray: ...
+def allclose(a: Any, b: Any, rtol: float=1e-05, atol: float=1e-08) -> builtins.bool: ...
+def arange(start: int, stop: int=None, step: int=None, dtype: DataType=None) -> ndarray[int]: ...
+def array(object: Sequence, dtype: DataType=None) -> ndarray: ...
+def array_equal(a1: ndarray, a2: ndarray) -> builtins.bool: ...
+def asarray(a: Any, dtype: DataType=None) -> ndarray: ...
+def clip(a: Any, a_min: Any, a_max: Any) -> ndarray: ...
+def concatenate(arrays: Sequence[ndarray[T]], axis: int=0) -> ndarray[T]: ...
+def cumsum(a: Union[Sequence, ndarray], dtype: DataType=None) -> ndarray[int]: ...
+def exp(x: Any) -> ndarray: ...
+def frombuffer(buffer: bytes, dtype: DataType=None) -> ndarray: ...
+def full(shape: Shape, fill_value: Any, dtype: DataType=None) -> ndarray: ...
+def isclose(a: Any, b: Any, rtol: float=1e-05, atol: float=1e-08) -> Any: ...
+def load(file: str) -> Any: ...
 def log(a: ndarray[T]) -> ndarray[T]: ...
+def memmap(filename: str, dtype: DataType=None, mode: str='r+', offset: int=0, shape: Shape=None) -> ndarray: ...
 def nextafter(a: T, b: T) -> T: ...
+def nonzero(a: ndarray) -> Tuple[ndarray[int], ...]: ...
 def ones(shape: Shape,  dtype: DataType=None) -> ndarray[T]: ...
+def percentile(a: Any, q: Any) -> Any: ...
+def repeat(a: ndarray[T], repeats: Any) -> ndarray[T]: ...
 def resize(a: ndarray[T], shape: Shape) -> ndarray[T]: ...
-def where(cond, if_true: ndarray[T]=None, if_false: ndarray[T]=None) -> ndarray[T]: ...
-def zeros(shape: Shape,  dtype: DataType=None) -> ndarray[T]: ...
+def round(a: Any, decimals: int=0) -> ndarray: ...
+def savez_compressed(file: str, **arrays: ndarray) -> None: ...
+def searchsorted(a: ndarray, v: Any, side: str='left') -> Any: ...
+def stack(arrays: Sequence[ndarray], axis: int=0) -> ndarray: ...
+def tanh(x: Any) -> ndarray: ...
+def where(cond, if_true: Any=None, if_false: Any=None) -> ndarray: ...
+def zeros(shape: Shape,  dtype: DataType=None) -> ndarray: ...
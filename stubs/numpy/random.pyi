@@ -0,0 +1,10 @@
+from typing import Sequence, Union
+
+from . import Shape, ndarray
+
+class RandomState:
+    def __init__(self, seed: Union[int, Sequence[int]]=None) -> None: ...
+    def permutation(self, x: int) -> ndarray[int]: ...
+    def shuffle(self, x: ndarray) -> None: ...
+    def randn(self, *shape: int) -> ndarray: ...
+    def randint(self, low: int, high: int=None, size: Shape=None) -> ndarray: ...
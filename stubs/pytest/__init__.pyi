@@ -1,4 +1,4 @@
-from typing import Callable, Type
+from typing import Any, Callable, Type
 from mypy_extensions import NoReturn
 
 class raises:
@@ -8,6 +8,7 @@ class raises:
 
 def fixture(test: Callable) -> Callable: ...
 def fail(reason: str) -> NoReturn: ...
+def importorskip(modname: str, minversion: str=None) -> Any: ...
 
-import pytest.mark as mark
-import pytest.config as config
+from . import mark as mark
+from . import config as config
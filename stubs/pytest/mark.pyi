@@ -1,8 +1,9 @@
-from typing import Callable
+from typing import Callable, Sequence
 
 class skip:
     def __init__(self, test: Callable=None, reason: str=None) -> None: ...
     def __call__(self, test: Callable) -> Callable: ...
 
+def parametrize(argnames: str, argvalues: Sequence) -> Callable[[Callable], Callable]: ...
 def skipif(condition: bool, reason: str=None) -> Callable[[Callable], Callable]: ...
 def xfail(Callable) -> Callable: ...
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Any, Callable, List, Union
 
 
 class Redis:
@@ -6,7 +6,14 @@ class Redis:
     def rpop(self, name: Union[str, bytes]) -> None: ...
     def delete(self, name: Union[str, bytes]) -> None: ...
     def brpoplpush(self, src: Union[str, bytes], dest: Union[str, bytes], timeout: int=None) -> bytes: ...
+    def zrange(self, name: Union[str, bytes], start: int, end: int) -> List[bytes]: ...
+    def zrem(self, name: Union[str, bytes], *values: Union[str, bytes]) -> int: ...
+    def pipeline(self, transaction: bool=True) -> 'Pipeline': ...
+    def register_script(self, script: str) -> Callable[..., Any]: ...
 
 class StrictRedis(Redis):
     def __init__(self, db: int=None) -> None: ...
     def lrem(self, name: Union[str, bytes], count: int, value: Union[str, bytes]) -> None: ...
+
+class Pipeline(Redis):
+    def execute(self) -> List[Any]: ...
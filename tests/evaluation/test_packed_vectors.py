@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from sensibility.evaluation.packed_vectors import (PackedVectors,
+                                                   load_packed_vectors,
+                                                   pack_vectors)
+from sensibility.evaluation.vectors import Vectors
+from sensibility.source_vector import to_source_vector
+
+
+def setup():
+    from sensibility import current_language
+    current_language.set('python')
+
+
+def test_pack_vectors(temp_dir: Path) -> None:
+    """
+    Pack vectors from an SQLite3 database, and read them back.
+    """
+    examples = dict(
+        file_a=to_source_vector(b'print("hello, world!")'),
+        file_b=to_source_vector(b'import sys; sys.exit(0)'),
+        file_c=to_source_vector(b'print(934 * 2 * 3442990 + 1)')
+    )
+    vectors = Vectors.from_filename(temp_dir / 'vectors.sqlite3')
+    for name, vector in examples.items():
+        vectors[name] = vector
+
+    # Only pack a subset of the vectors.
+    packed_path = temp_dir / 'vectors'
+    pack_vectors(vectors, ['file_c', 'file_a'], packed_path)
+    vectors.disconnect()
+
+    packed = PackedVectors.from_path(packed_path)
+    assert set(packed) == {'file_a', 'file_c'}
+    for name in 'file_a', 'file_c':
+        assert examples[name] == to_source_vector_of(packed[name])
+
+    with pytest.raises(KeyError):
+        packed['file_b']
+
+    # Unknown hashes are ignored, like in Vectors.length_of_vectors()
+    expected = len(examples['file_a']) + len(examples['file_c'])
+    assert expected == packed.length_of_vectors({'file_a', 'file_b', 'file_c'})
+    assert 0 == packed.length_of_vectors(())
+
+
+def test_pack_nothing(temp_dir: Path) -> None:
+    """
+    An empty store can still be opened.
+    """
+    pack_vectors({}, [], temp_dir / 'vectors')
+    packed = PackedVectors.from_path(temp_dir / 'vectors')
+    assert len(packed) == 0
+
+
+def test_pack_unknown_vectors(temp_dir: Path) -> None:
+    """
+    Unknown hashes are skipped; a failed store is removed.
+    """
+    vector = to_source_vector(b'print("hello, world!")')
+    pack_vectors({'file_a': vector}, ['file_a', 'file_b'], temp_dir / 'vectors')
+    assert set(PackedVectors.from_path(temp_dir / 'vectors')) == {'file_a'}
+
+    def broken_vectors():
+        yield 'file_a'
+        raise RuntimeError
+    with pytest.raises(RuntimeError):
+        pack_vectors({'file_a': vector}, broken_vectors(), temp_dir / 'broken')
+    assert sorted(p.name for p in temp_dir.iterdir()) == ['vectors']
+
+
+def test_load_sqlite_only_when_allowed(temp_dir: Path) -> None:
+    vectors = Vectors.from_filename(temp_dir / 'vectors.sqlite3')
+    vectors['file_a'] = to_source_vector(b'import sys')
+    vectors.disconnect()
+
+    with pytest.raises(ValueError):
+        load_packed_vectors(temp_dir / 'vectors.sqlite3', ['file_a'])
+    packed = load_packed_vectors(temp_dir / 'vectors.sqlite3', ['file_a'],
+                                 allow_sqlite=True)
+    assert set(packed) == {'file_a'}
+
+
+def to_source_vector_of(array):
+    from sensibility.source_vector import SourceVector
+    return SourceVector(int(x) for x in array)
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yield Path(temp_dir)
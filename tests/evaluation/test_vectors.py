@@ -67,6 +67,22 @@ def test_length_of_vectors(new_vectors_path: Path) -> None:
     assert actual == vectors.length_of_vectors({'file_a', 'file_c'})
 
 
+def test_insert_many(new_vectors_path: Path) -> None:
+    examples = {
+        f'file_{n}': to_source_vector(b'x = ' + str(n).encode() * n)
+        for n in range(1, 8)
+    }
+    vectors = Vectors.from_filename(new_vectors_path)
+    vectors.insert_many(examples.items(), chunk_size=3)
+    vectors.disconnect()
+
+    vectors = Vectors.from_filename(new_vectors_path)
+    for name, vector in examples.items():
+        assert vectors[name] == vector
+    assert len(vectors) == len(examples)
+    assert set(vectors) == set(examples)
+
+
 @pytest.fixture
 def new_vectors_path():
     with tempfile.TemporaryDirectory() as temp_dir:
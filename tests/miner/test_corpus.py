@@ -79,6 +79,90 @@ def test_eligible_sources(populated_corpus: Corpus) -> None:
     assert 1 <= len(sources) < 3
 
 
+def test_insert_many(empty_corpus: Corpus, repository) -> None:
+    repo = repository
+    empty_corpus.insert_repository(repo)
+    files = [SourceFile(f'x = {n}\n'.encode()) for n in range(5)]
+    with empty_corpus.deferred_index():
+        empty_corpus.insert_source_files_from_repo(
+            (SourceFileInRepository(repo, source_file,
+                                    PurePosixPath(f'{n}.py'))
+             for n, source_file in enumerate(files + files[:2])),
+            chunk_size=2
+        )
+        empty_corpus.insert_source_summaries(
+            ((source_file.filehash, SourceSummary(sloc=1, n_tokens=4))
+             for source_file in files[1:]),
+            chunk_size=2
+        )
+        empty_corpus.insert_failures([files[-1].filehash])
+
+    for source_file in files:
+        assert empty_corpus[source_file.filehash] == source_file.source
+    # Two files are duplicated; one is empty; one failed to parse.
+    assert len(set(empty_corpus.eligible_sources)) == 3
+    assert empty_corpus.get_info(files[0].filehash).is_unique is False
+
+
+def test_deferred_index_after_crash(empty_corpus: Corpus) -> None:
+    def index_exists() -> bool:
+        return empty_corpus.conn.execute(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'index' AND name = 'idx_filehash'"
+        ).fetchone() is not None
+
+    with empty_corpus.deferred_index():
+        assert not index_exists()
+        # E.g., a previous run crashed before rebuilding the index.
+        with empty_corpus.deferred_index():
+            pass
+        assert index_exists()
+    assert index_exists()
+
+
+def test_insert_many_twice(empty_corpus: Corpus, repository) -> None:
+    empty_corpus.insert_repository(repository)
+    files = [SourceFile(f'x = {n}\n'.encode()) for n in range(3)]
+    empty_corpus.insert_source_files_from_repo(
+        SourceFileInRepository(repository, source_file,
+                               PurePosixPath(f'{n}.py'))
+        for n, source_file in enumerate(files)
+    )
+    # Running the same batch again (e.g., after an interruption) succeeds.
+    for _ in range(2):
+        empty_corpus.insert_source_summaries(
+            (source_file.filehash, SourceSummary(sloc=1, n_tokens=4))
+            for source_file in files[:2]
+        )
+        empty_corpus.insert_failures([files[2].filehash])
+    assert len(set(empty_corpus.eligible_sources)) == 2
+
+
+def test_stream_sources(empty_corpus: Corpus, repository) -> None:
+    empty_corpus.insert_repository(repository)
+    files = [SourceFile(f'x = {n}\n'.encode()) for n in range(5)]
+    empty_corpus.insert_source_files_from_repo(
+        SourceFileInRepository(repository, source_file,
+                               PurePosixPath(f'{n}.py'))
+        for n, source_file in enumerate(files)
+    )
+    empty_corpus.insert_source_summaries(
+        (source_file.filehash, SourceSummary(sloc=1, n_tokens=4))
+        for source_file in files[:3]
+    )
+
+    expected = {source_file.filehash: source_file.source
+                for source_file in files}
+    assert dict(empty_corpus.stream_sources(fetch_size=2)) == expected
+    assert dict(empty_corpus.stream_sources(eligible=True)) == {
+        source_file.filehash: source_file.source for source_file in files[:3]
+    }
+    wanted = [files[1].filehash, files[4].filehash, '0' * 64]
+    assert dict(empty_corpus.stream_sources(wanted)) == {
+        filehash: expected[filehash] for filehash in wanted[:2]
+    }
+
+
 # ################################ Fixtures ################################ #
 
 @pytest.fixture
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests extracting sources from repository zipballs.
+"""
+
+import io
+import json
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path, PurePosixPath
+from socketserver import ThreadingMixIn
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, cast
+
+import pytest  # type: ignore
+import requests
+
+from sensibility.language import language
+from sensibility.miner.corpus import Corpus
+from sensibility.miner.downloader import POLL_TIMEOUT, Downloader, spool
+from sensibility.miner.models import SourceFile
+from sensibility.miner.rqueue import WorkQueue
+
+REPOSITORIES = ['owner/first', 'owner/second', 'owner/third']
+
+
+def setup():
+    language.set('python')
+
+
+class FakeResponse:
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+        self.closed = False
+
+    def iter_content(self, chunk_size: int):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_extract_from_spooled_zip() -> None:
+    resp = FakeResponse(zipball('name'))
+
+    # Force the zipball to disk.
+    with spool(cast(requests.Response, resp), max_size=16) as zip_file, \
+            zipfile.ZipFile(zip_file) as archive:
+        sources = dict(Downloader.extract_sources(archive))
+
+    assert resp.closed
+    assert set(sources) == {PurePosixPath('setup.py'),
+                            PurePosixPath('pkg/__init__.py')}
+    setup_py = sources[PurePosixPath('setup.py')]
+    assert setup_py.source == b'import name\n'
+    assert setup_py.filehash == SourceFile(b'import name\n').filehash
+
+
+def test_download_concurrently(github) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = Corpus(path=Path(temp_dir) / 'sources.sqlite3', writable=True)
+        downloader = Downloader(workers=3, api_url=github, token='t0k3n',
+                                corpus=corpus)
+        with ThreadPoolExecutor(3) as executor:
+            list(executor.map(downloader.do_jobs,
+                              [[job] for job in REPOSITORIES]))
+
+        for job in REPOSITORIES:
+            name = job.split('/')[1]
+            source = f'import {name}\n'.encode('UTF-8')
+            assert corpus[SourceFile(source).filehash] == source
+
+    # Both rate limits were read from the responses.
+    assert downloader.rate_limit.remaining == 4997
+    assert downloader.client.rate_limit.remaining == 4997
+
+
+def test_fetch_in_batches(github) -> None:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = Corpus(path=Path(temp_dir) / 'sources.sqlite3', writable=True)
+        downloader = Downloader(api_url=github, token='t0k3n', corpus=corpus)
+        errors: List[str] = []
+        downloader.log_error = errors.append  # type: ignore
+        downloader.do_jobs(REPOSITORIES + ['owner/missing', 'owner/empty',
+                                           'not a repo'])
+
+        assert {info.name for info in map(corpus.get_info, [
+            SourceFile(f'import {job.split("/")[1]}\n'.encode('UTF-8')).filehash
+            for job in REPOSITORIES
+        ])} == {'first', 'second', 'third'}
+
+    assert sorted(errors) == ['not a repo', 'owner/empty', 'owner/missing']
+    # One query for all of the repositories.
+    assert StubGitHub.remaining['graphql'] == 4999
+
+
+def test_keep_alive_skips_dead_workers(downloader: Downloader) -> None:
+    class StubWorker:
+        heartbeats = 0
+
+        def heartbeat(self) -> None:
+            self.heartbeats += 1
+
+    def reap(lease: float) -> int:
+        # Stop after the first round.
+        downloader.stop()
+        return 0
+
+    downloader.queue = SimpleNamespace(reap=reap)  # type: ignore
+    dead_thread = threading.Thread(target=lambda: None)
+    dead_thread.start()
+    dead_thread.join()
+    live, dead = StubWorker(), StubWorker()
+
+    downloader.keep_alive([(cast(WorkQueue, live), threading.current_thread()),
+                           (cast(WorkQueue, dead), dead_thread)])
+    # The dead worker's lease is left to end, so its jobs are requeued.
+    assert (live.heartbeats, dead.heartbeats) == (1, 0)
+
+
+def test_work_until_stopped(downloader: Downloader) -> None:
+    class StubWorker:
+        name = 'worker'
+        timeouts: List[int] = []
+
+        def get_many(self, n: int, timeout: int = 0) -> List[bytes]:
+            # No jobs came before the timeout.
+            self.timeouts.append(timeout)
+            downloader.stop()
+            return []
+
+    worker = StubWorker()
+    downloader.work_forever(worker)  # type: ignore
+    assert worker.timeouts == [POLL_TIMEOUT]
+
+
+def test_refuse_in_memory_corpus() -> None:
+    with pytest.raises(ValueError):
+        Downloader(token='t0k3n', corpus=Corpus(url='sqlite://',
+                                                writable=True))
+
+
+def zipball(name: str) -> bytes:
+    contents = io.BytesIO()
+    with zipfile.ZipFile(contents, 'w') as archive:
+        archive.writestr(f'owner-{name}-9884ff9/', b'')
+        archive.writestr(f'owner-{name}-9884ff9/setup.py',
+                         f'import {name}\n'.encode('UTF-8'))
+        archive.writestr(f'owner-{name}-9884ff9/README.md', b'# Hello\n')
+        archive.writestr(f'owner-{name}-9884ff9/pkg/__init__.py', b'')
+    return contents.getvalue()
+
+
+class StubGitHub(BaseHTTPRequestHandler):
+    """
+    Answers like the parts of GitHub's API used by the downloader.
+    """
+    protocol_version = 'HTTP/1.1'
+    lock = threading.Lock()
+    remaining: Dict[str, int] = {}
+
+    def do_POST(self) -> None:
+        assert self.path == '/graphql'
+        assert self.headers['Authorization'] == 'bearer t0k3n'
+        length = int(self.headers['Content-Length'])
+        variables = json.loads(self.rfile.read(length))['variables']
+        data: Dict[str, Optional[Dict[str, Any]]] = {}
+        for n in range(len(variables) // 2):
+            owner, name = variables[f'owner{n}'], variables[f'name{n}']
+            repository: Dict[str, Any] = {
+                'nameWithOwner': f'{owner}/{name}',
+                'url': f'https://github.com/{owner}/{name}',
+                'defaultBranchRef': {'name': 'master', 'target': {
+                    'sha1': '9884ff9', 'committedDate': '2017-05-01T00:00:00Z'
+                }},
+                'licenseInfo': None,
+            }
+            if name == 'empty':
+                # Empty repositories have no branches.
+                repository['defaultBranchRef'] = None
+            data[f'r{n}'] = None if name == 'missing' else repository
+        self.reply(json.dumps({'data': data}).encode('UTF-8'),
+                   rate_limit='graphql')
+
+    def do_GET(self) -> None:
+        parts = self.path.split('/')
+        if parts[1] == 'repos':
+            # Redirect like the API does, to an unlimited download.
+            _, _, owner, name, _, revision = parts
+            self.send_response(302)
+            self.send_header('Location', f'/codeload/{owner}/{name}/{revision}')
+            self.send_header('Content-Length', '0')
+            self.send_rate_limit('core')
+            self.end_headers()
+        else:
+            self.reply(zipball(parts[3]))
+
+    def reply(self, body: bytes, rate_limit: str = None) -> None:
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        if rate_limit is not None:
+            self.send_rate_limit(rate_limit)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_rate_limit(self, resource: str) -> None:
+        with self.lock:
+            self.remaining[resource] -= 1
+            remaining = self.remaining[resource]
+        self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.send_header('X-RateLimit-Reset', '4102444800')
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def downloader():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = Corpus(path=Path(temp_dir) / 'sources.sqlite3', writable=True)
+        yield Downloader(token='t0k3n', corpus=corpus)
+
+
+@pytest.fixture
+def github():
+    StubGitHub.remaining = {'core': 5000, 'graphql': 5000}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGitHub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
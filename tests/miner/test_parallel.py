@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests processing the corpus in worker processes.
+"""
+
+import datetime
+import tempfile
+from collections import Counter
+from pathlib import Path, PurePosixPath
+
+import pytest  # type: ignore
+
+from sensibility.language import SourceSummary, language
+from sensibility.miner.corpus import Corpus
+from sensibility.miner.models import (RepositoryMetadata, SourceFile,
+                                      SourceFileInRepository)
+from sensibility.miner.parallel import (count_entries, map_sources,
+                                        summarize_source, vectorize_source)
+from sensibility.source_vector import to_source_vector
+
+SOURCES = [b'import sys\n', b'print("hello, world")\n', b'import java.util.*;\n']
+
+
+def setup():
+    language.set('python')
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_summarize(corpus: Corpus, workers: int) -> None:
+    files = [SourceFile(source) for source in SOURCES]
+    unknown = SourceFile(b'not in the corpus\n')
+    results = dict(map_sources(summarize_source,
+                               (source_file.filehash
+                                for source_file in files + [unknown]),
+                               workers=workers, corpus=corpus))
+    assert results == {
+        files[0].filehash: SourceSummary(sloc=1, n_tokens=3),
+        files[1].filehash: SourceSummary(sloc=1, n_tokens=5),
+        files[2].filehash: None,
+    }
+
+
+def test_vectorize(corpus: Corpus) -> None:
+    valid = [SourceFile(source) for source in SOURCES[:2]]
+    assert set(corpus.eligible_hashes) == set()
+    results = dict(map_sources(vectorize_source,
+                               (source_file.filehash for source_file in valid),
+                               workers=2, corpus=corpus))
+    assert results == {source_file.filehash: to_source_vector(source_file.source)
+                       for source_file in valid}
+
+
+def test_count_entries(corpus: Corpus) -> None:
+    valid = [SourceFile(source) for source in SOURCES[:2]]
+    counts: Counter = Counter()
+    for _, file_counts in map_sources(count_entries,
+                                      (source_file.filehash
+                                       for source_file in valid),
+                                      workers=2, corpus=corpus):
+        counts.update(file_counts)
+    assert counts == Counter({'NEWLINE': 2, '<IDENTIFIER>': 2, 'import': 1,
+                              '(': 1, '<STRING>': 1, ')': 1})
+
+
+@pytest.fixture
+def corpus():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = Corpus(path=Path(temp_dir) / 'sources.sqlite3', writable=True)
+        repo = RepositoryMetadata(owner='owner', name='name',
+                                  revision='01b474d88e84cf745ab1d96405fd48279fcb5a11',
+                                  license='mit',
+                                  commit_date=datetime.datetime.utcnow())
+        corpus.insert_repository(repo)
+        corpus.insert_source_files_from_repo(
+            SourceFileInRepository(repo, SourceFile(source),
+                                   PurePosixPath(f'{n}.py'))
+            for n, source in enumerate(SOURCES)
+        )
+        yield corpus
@@ -7,12 +7,18 @@ First, ensure the Redis server is running, and clear it.
 """
 
 import re
+import time
 
 import redis
 import pytest  # type: ignore
 
 from sensibility.miner.rqueue import Queue, WorkQueue
 
+try:
+    import fakeredis  # type: ignore
+except ImportError:
+    fakeredis = None
+
 
 def redis_running():
     try:
@@ -22,11 +28,14 @@ def redis_running():
     return True
 
 
-with_redis = pytest.mark.skipif(not redis_running(),
-                                reason='redis is not running')
+REDIS_RUNNING = redis_running()
+with_redis = pytest.mark.skipif(not REDIS_RUNNING and fakeredis is None,
+                                reason='neither redis nor fakeredis is available')
 
 @pytest.fixture
 def redis_client():
+    if not REDIS_RUNNING:
+        return fakeredis.FakeStrictRedis()
     client = redis.StrictRedis(db=1)
     assert client.flushdb()
     return client
@@ -56,3 +65,41 @@ def test_work_queue(redis_client):
 
     worker.acknowledge(b'hello')
     assert worker.get(timeout=1) is None
+
+
+@with_redis
+def test_get_many(redis_client):
+    q = Queue('foo', redis_client)
+    q.enqueue_many(f"repo/{n}" for n in range(3))
+
+    worker = WorkQueue(q)
+    assert worker.get_many(2) == [b'repo/0', b'repo/1']
+    assert worker.get_many(2) == [b'repo/2']
+    assert worker.get_many(2, timeout=1) == []
+    assert redis_client.zcard(worker.in_flight) == 3
+
+    worker.acknowledge_many([b'repo/0', b'repo/2'])
+    assert redis_client.zrange(worker.in_flight, 0, -1) == [b'repo/1']
+
+
+@with_redis
+def test_reap(redis_client):
+    q = Queue('foo', redis_client)
+    q.enqueue_many(f"repo/{n}" for n in range(4))
+    alive, dead = WorkQueue(q), WorkQueue(q)
+    assert dead.get_many(2) == [b'repo/0', b'repo/1']
+    assert alive.get_many(2) == [b'repo/2', b'repo/3']
+    q << "repo/4"
+
+    # Two minutes later, only one worker has renewed its leases, but one of
+    # its jobs has been claimed for too long.
+    now = time.time() + 120
+    redis_client.zadd(q.workers, {alive.name: now})
+    redis_client.zadd(alive.in_flight, {b'repo/2': now, b'repo/3': now - 90})
+
+    assert q.reap(lease=60, now=now) == 3
+    assert redis_client.zrange(q.workers, 0, -1) == [alive.name.encode()]
+    assert not redis_client.exists(dead.in_flight)
+    assert redis_client.zrange(alive.in_flight, 0, -1) == [b'repo/2']
+    # Requeued jobs are retried first.
+    assert sorted(alive.get_many(3)) == [b'repo/0', b'repo/1', b'repo/3']
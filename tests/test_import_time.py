@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests that importing sensibility stays cheap; see libexec/benchmark-imports.
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+
+def imported_modules(statement: str) -> set:
+    result = subprocess.run(
+        [sys.executable, '-c',
+         f'{statement}; import sys; print(*sorted(sys.modules))'],
+        stdout=subprocess.PIPE, check=True
+    )
+    return set(result.stdout.decode('UTF-8').split())
+
+
+def test_import_sensibility() -> None:
+    modules = imported_modules('import sensibility, sensibility._paths')
+    for slow_module in ('pkg_resources', 'numpy', 'sqlalchemy',
+                        'sensibility.language.python'):
+        assert slow_module not in modules
+
+
+def test_import_corpus() -> None:
+    pytest.importorskip('sqlalchemy')
+    modules = imported_modules('import sensibility.miner.corpus')
+    assert 'github3' not in modules
+    assert 'redis' not in modules
+
+
+def test_vocabulary_is_lazy() -> None:
+    """
+    Defining the language must not load its vocabulary.
+    """
+    modules = imported_modules(
+        'import sensibility.vocabulary as v;'
+        'v.Vocabulary.from_json_file = None;'
+        'from sensibility.language.python import python'
+    )
+    assert 'sensibility.language.python' in modules
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests producing batches for training.
+"""
+
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from sensibility.evaluation.vectors import Vectors
+from sensibility.model.lstm.loop_batches import (LoopBatchesEndlessly,
+                                                 LoopDualBatchesEndlessly,
+                                                 produce_in_parallel)
+from sensibility.model.lstm.shards import export_shards
+from sensibility.model.lstm.train import fit_from
+from sensibility.sentences import Sentences
+from sensibility.source_vector import to_source_vector
+
+
+def setup():
+    from sensibility import current_language
+    current_language.set('python')
+
+
+def test_visits_every_sample_once(vectors_path: Path) -> None:
+    batches = loop_batches(vectors_path)
+    n_tokens = len(list(all_tokens(vectors_path)))
+    assert batches.samples_per_epoch == n_tokens
+    # The last batch is partially full.
+    assert n_tokens % batches.batch_size != 0
+    assert batches.batches_per_epoch == n_tokens // batches.batch_size + 1
+
+    for epoch in range(2):
+        samples = list(epoch_of(batches, epoch))
+        assert len(samples) == batches.samples_per_epoch
+        # There should be exactly one sample per token, but only count the
+        # targets, because the contexts are padded.
+        targets = sorted(target for _context, target in samples)
+        assert targets == sorted(all_tokens(vectors_path))
+        # Four bytes per sample.
+        assert batches.order_for(epoch).dtype == np.int32
+
+
+@pytest.mark.parametrize('backwards', [False, True])
+def test_same_samples_as_sentences(vectors_path: Path, backwards: bool) -> None:
+    """
+    The windows gathered should be the same as the sentences of each file,
+    including the padding.
+    """
+    batches = loop_batches(vectors_path, backwards=backwards)
+    vectors = Vectors.from_filename(vectors_path)
+    make_sentences = (Sentences.backwards_from if backwards
+                      else Sentences.forwards_from)
+    expected = sorted(sentence
+                      for name in ('file_a', 'file_b', 'file_c')
+                      for sentence in make_sentences(vectors[name], 3))
+    assert expected == sorted(epoch_of(batches, 0))
+
+
+def test_deterministic_epochs(vectors_path: Path) -> None:
+    first, second = loop_batches(vectors_path), loop_batches(vectors_path)
+
+    assert list(epoch_of(first, 0)) == list(epoch_of(second, 0))
+    assert list(epoch_of(first, 1)) == list(epoch_of(second, 1))
+    # Batches can be requested out of order.
+    assert np.array_equal(first.samples(1, 3)[0], second.samples(1, 3)[0])
+    assert list(epoch_of(first, 0)) != list(epoch_of(first, 1))
+    other_seed = loop_batches(vectors_path, seed=1)
+    assert list(epoch_of(first, 0)) != list(epoch_of(other_seed, 0))
+
+
+def test_iterate_from(vectors_path: Path) -> None:
+    batches = loop_batches(vectors_path)
+    last = batches.batches_per_epoch - 1
+    resumed = batches.iterate_from(1, last - 1)
+    for key in [(1, last - 1), (1, last), (2, 0), (2, 1)]:
+        x, y = next(resumed)
+        expected_x, expected_y = batches.batch(*key)
+        assert np.array_equal(x, expected_x)
+        assert np.array_equal(y, expected_y)
+
+
+def test_produce_in_parallel(vectors_path: Path) -> None:
+    batches = loop_batches(vectors_path)
+    keys = [(epoch, index)
+            for epoch in range(2)
+            for index in range(batches.batches_per_epoch)]
+    in_parallel = list(produce_in_parallel(batches, iter(keys), workers=2))
+    assert len(in_parallel) == len(keys)
+    # The time spent in the workers is accounted for.
+    assert batches.stats.batches == len(keys)
+    assert batches.stats.samples == 2 * batches.samples_per_epoch
+    for key, (x, y) in zip(keys, in_parallel):
+        expected_x, expected_y = batches.batch(*key)
+        assert np.array_equal(x, expected_x)
+        assert np.array_equal(y, expected_y)
+
+
+def test_fit_from_stops_workers(vectors_path: Path) -> None:
+    """
+    Keras does not close its generators, so fit_from() must.
+    """
+    class Model:
+        stop_training = False
+
+        def fit_generator(self, generator, steps_per_epoch, *,
+                          validation_data, **kwargs) -> None:
+            next(generator)
+            next(validation_data)
+            # Like Keras, keep the generators around.
+            self.generators = generator, validation_data
+
+    model = Model()
+    fit_from((0, 1), model,
+             loop_batches(vectors_path, workers=1),
+             loop_batches(vectors_path, workers=1),
+             callbacks=[])
+    assert multiprocessing.active_children() == []
+
+
+@pytest.mark.parametrize('backwards', [False, True])
+def test_mask_padding(vectors_path: Path, backwards: bool) -> None:
+    """
+    Masked padding is all-zero; everything else is the same.
+    """
+    masked = LoopBatchesEndlessly(vectors_path=vectors_path,
+                                  filehashes={'file_a', 'file_b', 'file_c'},
+                                  batch_size=4,
+                                  context_length=3,
+                                  backwards=backwards,
+                                  mask_padding=True,
+                                  allow_sqlite=True)
+    unmasked = loop_batches(vectors_path, backwards=backwards)
+    padding = masked.padding(backwards)
+    assert padding is not None
+    for index in range(masked.batches_per_epoch):
+        contexts, _targets = masked.samples(0, index)
+        x, y = masked.batch(0, index)
+        expected_x, expected_y = unmasked.batch(0, index)
+        assert np.array_equal(y, expected_y)
+        expected_x[:, :, padding] = False
+        assert np.array_equal(x, expected_x)
+        assert np.array_equal(x.any(axis=-1), contexts != padding)
+
+
+def test_dual_batches(vectors_path: Path) -> None:
+    """
+    Dual batches have the same samples as forwards and backwards batches.
+    """
+    dual = LoopDualBatchesEndlessly(vectors_path=vectors_path,
+                                    filehashes={'file_a', 'file_b', 'file_c'},
+                                    batch_size=4,
+                                    context_length=3,
+                                    allow_sqlite=True)
+    forwards = loop_batches(vectors_path)
+    backwards = loop_batches(vectors_path, backwards=True)
+    assert dual.batches_per_epoch == forwards.batches_per_epoch
+    for index in range(dual.batches_per_epoch):
+        (x_forwards, x_backwards), (y_forwards, y_backwards) = dual.batch(1, index)
+        assert np.array_equal(x_forwards, forwards.batch(1, index)[0])
+        assert np.array_equal(x_backwards, backwards.batch(1, index)[0])
+        assert np.array_equal(y_forwards, backwards.batch(1, index)[1])
+        assert np.array_equal(y_forwards, y_backwards)
+
+
+def test_shards(vectors_path: Path) -> None:
+    """
+    Streaming from exported shards yields the same samples.
+    """
+    shards_path = vectors_path.parent / 'shards'
+    export_shards(loop_batches(vectors_path, batch_size=5), shards_path)
+    assert (shards_path / 'shard-00000.npz').exists()
+
+    from_vectors = loop_batches(vectors_path)
+    from_shards = loop_batches(vectors_path, shards_path=shards_path)
+    assert from_shards.shards is not None
+    assert from_shards.samples_per_epoch == from_vectors.samples_per_epoch
+    assert from_shards.batches_per_epoch == from_vectors.batches_per_epoch
+    for epoch in range(2):
+        assert (sorted(epoch_of(from_shards, epoch)) ==
+                sorted(epoch_of(from_vectors, epoch)))
+    assert list(epoch_of(from_shards, 0)) != list(epoch_of(from_shards, 1))
+
+    # Shards must match the samples requested.
+    with pytest.raises(ValueError):
+        loop_batches(vectors_path, backwards=True, shards_path=shards_path)
+
+
+def loop_batches(vectors_path: Path, seed: int=0,
+                 backwards: bool=False,
+                 batch_size: int=4,
+                 shards_path: Path=None,
+                 workers: int=0) -> LoopBatchesEndlessly:
+    return LoopBatchesEndlessly(vectors_path=vectors_path,
+                                filehashes={'file_a', 'file_b', 'file_c'},
+                                batch_size=batch_size,
+                                context_length=3,
+                                backwards=backwards,
+                                seed=seed,
+                                workers=workers,
+                                shards_path=shards_path,
+                                allow_sqlite=True)
+
+
+def epoch_of(batches: LoopBatchesEndlessly, epoch: int):
+    """
+    Yields every sample of the epoch as a sentence.
+    """
+    for index in range(batches.batches_per_epoch):
+        contexts, targets = batches.samples(epoch, index)
+        for context, target in zip(contexts, targets):
+            yield tuple(int(t) for t in context), int(target)
+
+
+def all_tokens(vectors_path: Path):
+    vectors = Vectors.from_filename(vectors_path)
+    for name in 'file_a', 'file_b', 'file_c':
+        yield from vectors[name]
+
+
+@pytest.fixture
+def vectors_path():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'vectors.sqlite3'
+        vectors = Vectors.from_filename(path)
+        vectors['file_a'] = to_source_vector(b'print("hello, world!")')
+        vectors['file_b'] = to_source_vector(b'import sys; sys.exit(0)')
+        vectors['file_c'] = to_source_vector(b'print(934 * 2 * 3442990 + 1)')
+        vectors.disconnect()
+        yield path
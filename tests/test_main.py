@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests running subcommands in-process with the `sensibility` command.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from sensibility.__main__ import run_batch
+
+
+def test_batch(capsys) -> None:
+    env = {name: value for name, value in os.environ.items()
+           if name != 'SENSIBILITY_LANGUAGE'}
+    status = run_batch(['-l python where sources\n',
+                        '# A comment, then a blank line\n',
+                        '\n',
+                        '-l python where vectors\n',
+                        # The language is not carried over.
+                        'where vectors\n'], env)
+    assert status == 1
+    out, err = capsys.readouterr()
+    sources, vectors = out.splitlines()
+    assert sources.endswith(os.path.join('python', 'sources.sqlite3'))
+    assert vectors.endswith(os.path.join('python', 'vectors.sqlite3'))
+    assert 'LanguageNotSpecifiedError' in err
+
+
+def test_batch_redirection(capsys) -> None:
+    env = dict(os.environ, SENSIBILITY_LANGUAGE='python')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = Path(temp_dir) / 'where.txt'
+        assert run_batch([f'where mistakes > {output}'], env) == 0
+        assert output.read_text().strip().endswith('mistakes.sqlite3')
+    out, _err = capsys.readouterr()
+    assert out == ''
+
+
+def test_batch_continues_after_failure(capsys) -> None:
+    argv = sys.argv[:]
+    env = dict(os.environ, SENSIBILITY_LANGUAGE='python')
+    status = run_batch(['where nonexistent-item',
+                        'not-a-command',
+                        'where sources'], env)
+    assert status == 1
+    assert sys.argv == argv
+    out, err = capsys.readouterr()
+    assert out.strip().endswith('sources.sqlite3')
+    assert 'where nonexistent-item: exited with status 1' in err
+    assert 'not-a-command: exited with status 2' in err
+
+
+def test_batch_redirects_binary_stdin(capsys) -> None:
+    env = dict(os.environ, SENSIBILITY_LANGUAGE='python')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = Path(temp_dir) / 'source.py'
+        source.write_bytes(b'import os\n')
+        assert run_batch([f'tokenize < {source}',
+                          f'summarize < {source}',
+                          # Without a redirection, stdin is empty.
+                          'summarize'], env) == 0
+    out, _err = capsys.readouterr()
+    assert "value='os'" in out
+    assert out.split()[-4:] == ['1', '3', '0', '0']
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests predicting with NumPy models.
+"""
+
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pytest
+
+from sensibility import current_language
+from sensibility.model.lstm.numpy_model import (LSTM, NumpyDualLSTMModel,
+                                                NumpyLSTMModel,
+                                                read_model_config,
+                                                sequential_layers)
+from sensibility.sentences import backward_sentences, forward_sentences
+from sensibility.source_vector import to_source_vector
+
+CONTEXT_LENGTH = 4
+
+
+def setup():
+    current_language.set('python')
+
+
+def test_lstm_step() -> None:
+    """
+    One time step of the LSTM, computed by hand.
+    """
+    rng = np.random.RandomState(1)
+    layer = random_lstm(rng, inputs=3, units=2, return_sequences=False)
+    x = rng.randn(1, 1, 3)
+
+    def sigmoid(v: np.ndarray) -> np.ndarray:
+        return np.clip(0.2 * v + 0.5, 0., 1.)
+
+    z = x[0, 0] @ layer.kernel + layer.bias
+    i, f = sigmoid(z[:2]), sigmoid(z[2:4])
+    g, o = np.tanh(z[4:6]), sigmoid(z[6:])
+    expected = o * np.tanh(f * 0. + i * g)
+    assert np.allclose(layer.recur(layer.project(x)), expected)
+
+
+def test_masking_skips_time_steps() -> None:
+    rng = np.random.RandomState(2)
+    layer = random_lstm(rng, inputs=3, units=5, return_sequences=False)
+    x = rng.randn(1, 4, 3)
+    mask = np.array([[False, False, True, True]])
+    masked = layer.recur(layer.project(x), mask)
+    assert np.allclose(masked, layer.recur(layer.project(x[:, 2:])))
+
+
+def test_predict_file(model: NumpyDualLSTMModel) -> None:
+    vector = to_source_vector(b'print("hello, world!")')
+    results = model.predict_file(vector)
+    assert len(results) == len(vector)
+
+    fw_contexts = np.array([context for context, _ in
+                            forward_sentences(vector, CONTEXT_LENGTH)])
+    bw_contexts = np.array([context for context, _ in
+                            backward_sentences(vector, CONTEXT_LENGTH)])
+    vocabulary = current_language.vocabulary
+    fw_expected = model.forwards.predict(fw_contexts,
+                                         vocabulary.start_token_index)
+    bw_expected = model.backwards.predict(bw_contexts,
+                                          vocabulary.end_token_index)
+    for result, fw, bw in zip(results, fw_expected, bw_expected):
+        assert np.allclose(result.forwards, fw)
+        assert np.allclose(result.backwards, bw)
+        assert np.isclose(result.forwards.sum(), 1.)
+        assert result.forwards.shape == (len(vocabulary),)
+
+
+def test_predict_stream(model: NumpyDualLSTMModel) -> None:
+    """
+    Streaming sees the same tokens as the windows until the context is
+    full; padding is masked, so the predictions are the same.
+    """
+    vector = to_source_vector(b'print(934 * 2 * 3442990 + 1)')
+    assert len(vector) > CONTEXT_LENGTH + 1
+    windowed = model.predict_file(vector)
+    model.stream = True
+    streamed = model.predict_file(vector)
+
+    assert len(streamed) == len(vector)
+    for n, (expected, actual) in enumerate(zip(windowed, streamed)):
+        assert np.isclose(actual.forwards.sum(), 1.)
+        assert np.allclose(expected.backwards, actual.backwards)
+        if n <= CONTEXT_LENGTH:
+            assert np.allclose(expected.forwards, actual.forwards, atol=1e-6)
+
+
+def test_predict_stream_empty(model: NumpyDualLSTMModel) -> None:
+    padding = current_language.vocabulary.start_token_index
+    assert model.forwards.predict_stream(np.array([], dtype=np.uint8),
+                                         padding).shape[0] == 0
+
+
+@pytest.mark.parametrize('dtype,tolerance', [
+    ('float32', 0.),
+    ('float16', 1e-3),
+    ('int8', 2e-2),
+])
+def test_export(model: NumpyDualLSTMModel, dtype: str, tolerance: float) -> None:
+    vector = to_source_vector(b'import sys; sys.exit(0)')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'model.npz'
+        model.save(path, dtype=dtype)
+        exported = NumpyDualLSTMModel.from_filename(path)
+
+    assert exported.forwards.masks_padding
+    assert len(exported.backwards.layers) == 2
+    for expected, actual in zip(model.predict_file(vector),
+                                exported.predict_file(vector)):
+        assert np.allclose(expected.forwards, actual.forwards, atol=tolerance)
+        assert np.allclose(expected.backwards, actual.backwards, atol=tolerance)
+
+
+def test_read_hdf5(model: NumpyDualLSTMModel) -> None:
+    """
+    Reads models from HDF5 files laid out like Keras does.
+    """
+    vector = to_source_vector(b'print(934 * 2 * 3442990 + 1)')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = Path(temp_dir)
+        save_like_keras(model.forwards, directory / 'forwards.hdf5')
+        save_like_keras(model.backwards, directory / 'backwards.hdf5')
+        loaded = NumpyDualLSTMModel.from_directory(directory)
+
+        config = read_model_config(directory / 'forwards.hdf5')
+
+    assert [layer['config']['name'] for layer in sequential_layers(config)] == [
+        'masking_1', 'lstm_1', 'lstm_2', 'dropout_1', 'dense_1', 'activation_1'
+    ]
+    assert loaded.context_length == CONTEXT_LENGTH
+    assert loaded.forwards.masks_padding
+    for expected, actual in zip(model.predict_file(vector),
+                                loaded.predict_file(vector)):
+        assert np.array_equal(expected.forwards, actual.forwards)
+        assert np.array_equal(expected.backwards, actual.backwards)
+
+
+def test_same_as_keras() -> None:
+    keras = pytest.importorskip('keras')
+    from keras.layers import LSTM as KerasLSTM, Dense, Activation, Masking
+    vocabulary_size = len(current_language.vocabulary)
+    keras_model = keras.models.Sequential([
+        Masking(mask_value=0.,
+                input_shape=(CONTEXT_LENGTH, vocabulary_size)),
+        KerasLSTM(8, return_sequences=True),
+        KerasLSTM(6),
+        Dense(vocabulary_size),
+        Activation('softmax'),
+    ])
+    model = NumpyLSTMModel.from_keras(keras_model)
+
+    rng = np.random.RandomState(3)
+    contexts = rng.randint(3, vocabulary_size, size=(16, CONTEXT_LENGTH))
+    # Pad a few of the contexts.
+    contexts[:4, :2] = current_language.vocabulary.start_token_index
+    x = np.zeros((16, CONTEXT_LENGTH, vocabulary_size), dtype=np.float32)
+    for sample, context in enumerate(contexts):
+        for t, token in enumerate(context):
+            if token != current_language.vocabulary.start_token_index:
+                x[sample, t, token] = 1.
+    expected = keras_model.predict(x)
+    actual = model.predict(contexts,
+                           current_language.vocabulary.start_token_index)
+    assert np.allclose(expected, actual, atol=1e-5)
+
+
+def save_like_keras(model: NumpyLSTMModel, path: Path) -> None:
+    """
+    Saves the model in the HDF5 layout of keras.models.save_model().
+    """
+    import h5py  # type: ignore
+    vocabulary_size = len(current_language.vocabulary)
+    layers: List[Tuple[str, str, Dict[str, Any], List[Any]]] = [
+        ('Masking', 'masking_1',
+         dict(batch_input_shape=[None, CONTEXT_LENGTH, vocabulary_size],
+              mask_value=0.), [])
+    ]
+    for n, lstm in enumerate(model.layers, start=1):
+        layers.append(('LSTM', f'lstm_{n}',
+                       dict(activation='tanh',
+                            recurrent_activation='hard_sigmoid',
+                            use_bias=True,
+                            return_sequences=lstm.return_sequences),
+                       [('kernel', lstm.kernel),
+                        ('recurrent_kernel', lstm.recurrent_kernel),
+                        ('bias', lstm.bias)]))
+    layers.append(('Dropout', 'dropout_1', dict(rate=0.5), []))
+    layers.append(('Dense', 'dense_1', dict(units=vocabulary_size),
+                   [('kernel', model.dense_kernel),
+                    ('bias', model.dense_bias)]))
+    layers.append(('Activation', 'activation_1',
+                   dict(activation='softmax'), []))
+
+    config = dict(class_name='Sequential', config=[
+        dict(class_name=kind, config=dict(layer_config, name=name))
+        for kind, name, layer_config, _ in layers
+    ])
+    with h5py.File(str(path), 'w') as model_file:
+        model_file.attrs['model_config'] = json.dumps(config).encode('UTF-8')
+        weights_group = model_file.create_group('model_weights')
+        weights_group.attrs['layer_names'] = [name.encode('UTF-8')
+                                              for _, name, _, _ in layers]
+        for _, name, _, weights in layers:
+            group = weights_group.create_group(name)
+            weight_names = [f'{name}/{weight}:0'.encode('UTF-8')
+                            for weight, _ in weights]
+            group.attrs['weight_names'] = weight_names
+            for weight_name, (_, array) in zip(weight_names, weights):
+                group.create_dataset(weight_name.decode('UTF-8'), data=array)
+
+
+def random_lstm(rng, *, inputs: int, units: int,
+                return_sequences: bool) -> LSTM:
+    return LSTM(rng.randn(inputs, 4 * units).astype(np.float32),
+                rng.randn(units, 4 * units).astype(np.float32),
+                rng.randn(4 * units).astype(np.float32),
+                return_sequences=return_sequences)
+
+
+def random_model(rng) -> NumpyLSTMModel:
+    vocabulary_size = len(current_language.vocabulary)
+    return NumpyLSTMModel(
+        [random_lstm(rng, inputs=vocabulary_size, units=8, return_sequences=True),
+         random_lstm(rng, inputs=8, units=6, return_sequences=False)],
+        rng.randn(6, vocabulary_size).astype(np.float32),
+        rng.randn(vocabulary_size).astype(np.float32),
+        context_length=CONTEXT_LENGTH,
+        masks_padding=True,
+    )
+
+
+@pytest.fixture
+def model() -> NumpyDualLSTMModel:
+    rng = np.random.RandomState(0)
+    return NumpyDualLSTMModel(forwards=random_model(rng),
+                              backwards=random_model(rng))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests measuring training throughput.
+"""
+
+import csv
+import json
+import tempfile
+from pathlib import Path
+
+from sensibility.model.lstm.throughput import PipelineStats, ThroughputLogger
+
+
+def test_throughput_logger() -> None:
+    stats = PipelineStats()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = Path(temp_dir) / 'throughput.csv'
+        manifest_path = Path(temp_dir) / 'manifest.json'
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump({'context_length': 9}, manifest_file)
+
+        logger = ThroughputLogger(stats, csv_path=csv_path,
+                                  manifest_path=manifest_path)
+        logger.on_train_begin()
+        for epoch in range(2):
+            logger.on_epoch_begin(epoch)
+            for batch in range(3):
+                # Pretend the pipeline produced a batch.
+                stats.add(PipelineStats(1, 32, io_time=0.25, encode_time=0.5))
+                logger.on_batch_begin(batch, {'batch': batch, 'size': 32})
+                logger.on_batch_end(batch, {'batch': batch, 'size': 32,
+                                            'loss': 1.0})
+            logger.on_epoch_end(epoch, {'loss': 1.0, 'val_loss': 2.0})
+        logger.on_train_end()
+
+        with open(csv_path) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    assert [int(row['epoch']) for row in rows] == [0, 1]
+    for row in rows:
+        assert int(row['samples']) == 96
+        assert float(row['io_time']) == 0.75
+        assert float(row['encode_time']) == 1.5
+        assert float(row['samples_per_second']) > 0
+
+    # The existing manifest is kept.
+    assert manifest['context_length'] == 9
+    assert manifest['throughput']['epochs'] == 2
+    assert manifest['throughput']['samples'] == 192
+    assert manifest['throughput']['io_time'] == 1.5
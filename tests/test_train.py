@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+"""
+Tests resuming training.
+"""
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from sensibility.model.lstm.train import ModelDescription, ResumePoint
+
+
+def test_resume_from_intermediate(description: ModelDescription) -> None:
+    assert description.resume_point() is None
+    (description.incomplete_path / 'intermediate-2.1664-00.hdf5').touch()
+    last = description.incomplete_path / 'intermediate-2.0000-01.hdf5'
+    last.touch()
+    assert description.resume_point() == ResumePoint(last, (2, 0))
+
+
+def test_resume_from_interruption(description: ModelDescription) -> None:
+    pytest.importorskip('keras')
+    tracker = description.tracker((3, 5))
+    # Finish the resumed epoch...
+    tracker.on_epoch_begin(3)
+    for batch in range(5, 10):
+        tracker.on_batch_begin(batch)
+        tracker.on_batch_end(batch)
+    checkpoint = description.incomplete_path / 'intermediate-2.0000-03.hdf5'
+    checkpoint.touch()
+    tracker.on_epoch_end(3)
+    assert description.resume_point() == ResumePoint(checkpoint, (4, 0))
+
+    # ...then get interrupted during the next one.
+    tracker.on_epoch_begin(4)
+    for batch in range(7):
+        tracker.on_batch_begin(batch)
+        tracker.on_batch_end(batch)
+    tracker.on_batch_begin(7)
+    assert tracker.position == (4, 7)
+    description.interrupted_path.touch()
+    description.save_pipeline_state(
+        tracker.resume_point(description.interrupted_path)
+    )
+    assert description.resume_point() == ResumePoint(
+        description.interrupted_path, (4, 7)
+    )
+
+
+def test_ignore_stale_state(description: ModelDescription) -> None:
+    description.save_pipeline_state(
+        ResumePoint(description.interrupted_path, (1, 2))
+    )
+    # The interrupted model was never saved.
+    assert description.resume_point() is None
+
+
+def test_resume_stopped(description: ModelDescription) -> None:
+    pytest.importorskip('keras')
+    tracker = description.tracker((0, 0))
+    tracker.set_model(FakeModel(stop_training=True))
+    checkpoint = description.incomplete_path / 'intermediate-2.0000-00.hdf5'
+    checkpoint.touch()
+    tracker.on_epoch_end(0)
+    assert description.resume_point() == ResumePoint(checkpoint, (1, 0),
+                                                     stopped=True)
+
+
+def test_resume_early_stopping(description: ModelDescription) -> None:
+    pytest.importorskip('keras')
+    tracker = description.tracker((0, 0))
+    early_stopping = tracker.early_stopping
+    early_stopping.set_model(FakeModel(stop_training=False))
+    early_stopping.on_train_begin()
+    early_stopping.on_epoch_end(0, {'val_loss': 2.0})
+    early_stopping.on_epoch_end(1, {'val_loss': 3.0})
+    # Another call to fit_generator() continues counting...
+    early_stopping.on_train_begin()
+    assert early_stopping.state == dict(wait=1, best=2.0)
+
+    # ...and so does resuming from the checkpoint.
+    checkpoint = description.incomplete_path / 'intermediate-3.0000-01.hdf5'
+    checkpoint.touch()
+    tracker.on_epoch_end(1)
+    resumed = description.tracker((2, 0), description.resume_point())
+    resumed.early_stopping.on_train_begin()
+    assert resumed.early_stopping.state == dict(wait=1, best=2.0)
+
+
+class FakeModel:
+    def __init__(self, stop_training: bool) -> None:
+        self.stop_training = stop_training
+
+
+@pytest.fixture
+def description():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        description = ModelDescription(backwards=False,
+                                       output_dir=Path(temp_dir) / 'model',
+                                       batch_size=32,
+                                       context_length=9,
+                                       partition=0,
+                                       hidden_layers=(20,),
+                                       learning_rate=0.001,
+                                       patience=3,
+                                       dropout=None,
+                                       optimizer='rmsprop',
+                                       training_set=set(),
+                                       validation_set=set(),
+                                       vectors_path=Path(temp_dir) / 'vectors')
+        description.incomplete_path.mkdir()
+        yield description